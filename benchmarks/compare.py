@@ -0,0 +1,52 @@
+"""
+Compare two result files written by `benchmarks/main.py`.
+
+    python benchmarks/compare.py before.json after.json --threshold 0.1
+
+Exits with status 1 if any benchmark's median got slower by more than
+the threshold (a fraction; 0.1 means 10%).
+"""
+import sys
+import json
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    # Timings are in seconds, and shown in milliseconds.
+    if before['meta'].get('unit', 'seconds') == 'seconds':
+        scale, unit = 1000.0, 'ms'
+    else:
+        scale, unit = 1.0, before['meta']['unit'][0]
+    before = before['results']
+    after = after['results']
+
+    regressions = []
+    print(f"{'benchmark':20} {'before':>12} {'after':>12} {'change':>8}")
+    for name in before:
+        if name not in after:
+            continue
+        old = before[name]['median']
+        new = after[name]['median']
+        change = (new - old) / old if old else 0.0
+        print(f"{name:20} {old * scale:9.3f} {unit:2} {new * scale:9.3f} {unit:2} "
+              f"{change * 100.0:+7.1f}%")
+        if change > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""
+Headless benchmarks for metagui.
+
+    python benchmarks/main.py --output before.json
+    python benchmarks/main.py --output after.json
+    python benchmarks/compare.py before.json after.json
+
+Each benchmark builds a fresh tree of `HorizontalFrame`s and
+`VerticalFrame`s, alternating by level, with `--width` children per
+frame and `--depth` levels of frames above the `Element` leaves. Every
+operation is timed `--repeat` times; the results are written as JSON.
+
+The `render` benchmarks only draw anything with `--window-type
+offscreen`. For `render_static`, the nodes and `Geom`s (about one draw
+call each) that rendering the tree costs with and without batching are
+reported in the results' `meta`. `render_scrolled` draws a `--rows`
+long list that is scrolled to its middle.
+
+`table_nested` and `table_grid` lay out a `TABLE_ROWS` by `TABLE_COLUMNS`
+table, made of nested frames and of a `GridFrame` respectively, at each
+of `ASPECT_RATIOS`. They only time the layout math, no widgets are
+created.
+
+`resize_indexed` is `resize` with a spatial index to keep up to date,
+and `element_at` times `HIT_TESTS` lookups in that index.
+
+`cycles` times frames with window resizes after `CYCLES` GUIs were
+created and destroyed, and fails if any of them left a task behind.
+`cycles_none` times the same frames without any cycles before; The two
+should take the same time.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import platform
+import statistics
+import subprocess
+
+from panda3d.core import load_prc_file_data
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--width', type=int, default=4,
+                        help="children per frame")
+    parser.add_argument('--depth', type=int, default=4,
+                        help="levels of frames")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="timed runs per benchmark")
+    parser.add_argument('--mutations', type=int, default=200,
+                        help="children added and removed in add_remove")
+    parser.add_argument('--rows', type=int, default=2000,
+                        help="rows in the scrolling benchmarks")
+    parser.add_argument('--window-type', default='none',
+                        choices=['none', 'offscreen'])
+    parser.add_argument('--only', nargs='*', default=None,
+                        help="names of benchmarks to run")
+    parser.add_argument('--output', default=None,
+                        help="file to write results to, instead of stdout")
+    return parser.parse_args()
+
+
+args = parse_args()
+load_prc_file_data(
+    '',
+    f'window-type {args.window_type}\n'
+    'audio-library-name null\n'
+    'notify-level-device fatal\n'
+    'notify-level-display fatal\n'
+)
+
+from panda3d.core import TextNode
+from direct.showbase.ShowBase import ShowBase
+from direct.gui.DirectGui import DirectLabel
+
+from metagui.gui import SizeSpec
+from metagui.gui import WholeScreen
+from metagui.gui import HorizontalFrame
+from metagui.gui import VerticalFrame
+from metagui.gui import GridFrame
+from metagui.gui import Element
+from metagui.gui import ScrollableFrame
+from metagui.gui import VirtualScrollableFrame
+from metagui.gui import StaticFrame
+from metagui.gui import LazyFrame
+from metagui.layout import solve
+from metagui.description import dump
+from metagui.description import load_compiled
+from metagui.description import Builder
+
+
+ASPECT_RATIOS = [4 / 3, 16 / 9, 21 / 9, 1.0, 9 / 16]
+RENDER_FRAMES = 10
+CYCLES = 50
+TABLE_ROWS = 200
+TABLE_COLUMNS = 20
+HIT_TESTS = 1000
+render_cost = dict()
+
+
+def leaf(idx=0):
+    return Element(
+        DirectLabel,
+        kwargs=dict(
+            text=str(idx),
+            text_pos=(0, -0.02),
+            text_align=TextNode.ACenter,
+            text_scale=0.03,
+            frameColor=(0.8, 0.8, 0.8, 1),
+        ),
+        size_spec=SizeSpec(w_min=0.01, h_min=0.01),
+    )
+
+
+def text_leaf(idx=0):
+    return Element(
+        DirectLabel,
+        kwargs=dict(
+            text=f"Item number {idx}, with text that wraps",
+            text_scale=0.03,
+            frameColor=(0.8, 0.8, 0.8, 1),
+        ),
+        size_spec=SizeSpec(w_min=0.01),
+        text_size='wrap',
+    )
+
+
+def build_tree(width, depth, horizontal=True, make_leaf=leaf):
+    if depth == 0:
+        return make_leaf()
+    frame_cls = HorizontalFrame if horizontal else VerticalFrame
+    return frame_cls(
+        *[
+            build_tree(width, depth - 1, not horizontal, make_leaf)
+            for _ in range(width)
+        ]
+    )
+
+
+def row_list(rows):
+    return VerticalFrame(
+        *[leaf(idx) for idx in range(rows)],
+    )
+
+
+def table_cell(row, column):
+    return Element(
+        DirectLabel,
+        kwargs=dict(text=f"{row}:{column}"),
+        size_spec=SizeSpec(w_min=0.01 * (column % 3 + 1), h_min=0.05,
+                           h_weight=0.0),
+    )
+
+
+def nested_table():
+    return VerticalFrame(*[
+        HorizontalFrame(*[
+            table_cell(row, column) for column in range(TABLE_COLUMNS)
+        ])
+        for row in range(TABLE_ROWS)
+    ])
+
+
+def grid_table():
+    return GridFrame(*[
+        (table_cell(row, column), row, column)
+        for row in range(TABLE_ROWS)
+        for column in range(TABLE_COLUMNS)
+    ])
+
+
+def set_aspect_ratio(aspect_ratio):
+    base.adjustWindowAspectRatio(aspect_ratio)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+# Every benchmark returns the time of one run.
+
+def bench_build():
+    return timed(lambda: build_tree(args.width, args.depth))
+
+
+def bench_create():
+    tree = build_tree(args.width, args.depth)
+    duration = timed(lambda: WholeScreen(tree, on_event=False))
+    tree.parent.destroy()
+    return duration
+
+
+def bench_create_lazy():
+    # As `create`, with all but one top-level subtree hidden and lazy.
+    tree = build_tree(args.width, args.depth)
+    tree.children[1:] = [LazyFrame(c) for c in tree.children[1:]]
+    duration = timed(lambda: WholeScreen(tree, on_event=False))
+    tree.parent.destroy()
+    return duration
+
+
+def bench_resize():
+    gui = WholeScreen(build_tree(args.width, args.depth), on_event=False)
+
+    def resize_all():
+        for aspect_ratio in ASPECT_RATIOS:
+            set_aspect_ratio(aspect_ratio)
+            gui.resize()
+    duration = timed(resize_all)
+    gui.destroy()
+    set_aspect_ratio(ASPECT_RATIOS[0])
+    return duration
+
+
+def bench_resize_indexed():
+    gui = WholeScreen(
+        build_tree(args.width, args.depth),
+        on_event=False,
+        spatial_index=True,
+    )
+
+    def resize_all():
+        for aspect_ratio in ASPECT_RATIOS:
+            set_aspect_ratio(aspect_ratio)
+            gui.resize()
+    duration = timed(resize_all)
+    gui.destroy()
+    set_aspect_ratio(ASPECT_RATIOS[0])
+    return duration
+
+
+def bench_element_at():
+    gui = WholeScreen(
+        build_tree(args.width, args.depth),
+        on_event=False,
+        spatial_index=True,
+    )
+    width = 2.0 * ASPECT_RATIOS[0]
+    # Points spread evenly over the screen, in `WholeScreen` coordinates
+    points = [
+        ((idx * 0.618034) % 1.0 * width, -((idx * 0.754878) % 1.0) * 2.0)
+        for idx in range(HIT_TESTS)
+    ]
+
+    def look_up():
+        for x, y in points:
+            gui.element_at(x, y)
+    duration = timed(look_up)
+    gui.destroy()
+    return duration
+
+
+def bench_resize_text():
+    # As `resize`, with leaves that wrap their text to their width.
+    tree = build_tree(args.width, args.depth, make_leaf=text_leaf)
+    gui = WholeScreen(tree, on_event=False)
+
+    def resize_all():
+        for aspect_ratio in ASPECT_RATIOS:
+            set_aspect_ratio(aspect_ratio)
+            gui.resize()
+    duration = timed(resize_all)
+    gui.destroy()
+    set_aspect_ratio(ASPECT_RATIOS[0])
+    return duration
+
+
+def bench_resize_unchanged():
+    gui = WholeScreen(build_tree(args.width, args.depth), on_event=False)
+    duration = timed(gui.resize)
+    gui.destroy()
+    return duration
+
+
+def bench_add_remove():
+    tree = build_tree(args.width, args.depth, horizontal=False)
+    gui = WholeScreen(tree, on_event=False)
+
+    def add_remove():
+        for idx in range(args.mutations):
+            tree.add(idx % (len(tree.children) + 1), leaf(idx))
+        for idx in range(args.mutations):
+            tree.remove(idx % len(tree.children))
+    duration = timed(add_remove)
+    gui.destroy()
+    return duration
+
+
+def bench_replace_leaf():
+    # Only one branch changes; The rest of the tree keeps its layout.
+    tree = build_tree(args.width, args.depth)
+    gui = WholeScreen(tree, on_event=False)
+    branch = tree
+    while isinstance(branch.children[0], (HorizontalFrame, VerticalFrame)):
+        branch = branch.children[0]
+
+    def replace():
+        for idx in range(args.mutations):
+            branch.splice(0, 1, [leaf(idx)])
+    duration = timed(replace)
+    gui.destroy()
+    return duration
+
+
+def bench_destroy():
+    gui = WholeScreen(build_tree(args.width, args.depth), on_event=False)
+    return timed(gui.destroy)
+
+
+def scroll(frame):
+    for step in range(21):
+        frame.np.verticalScroll['value'] = step / 20.0
+        base.task_mgr.step()
+
+
+def bench_scroll():
+    frame = ScrollableFrame(row_list(args.rows))
+    gui = WholeScreen(frame, on_event=False)
+    duration = timed(lambda: scroll(frame))
+    gui.destroy()
+    return duration
+
+
+def bench_scroll_virtual():
+    def bind_row(row, item):
+        row.np['text'] = str(item)
+    frame = VirtualScrollableFrame(
+        list(range(args.rows)),
+        leaf,
+        bind_row,
+        SizeSpec(w_min=0.01, h_min=0.05, h_weight=0.0),
+    )
+    gui = WholeScreen(frame, on_event=False)
+    duration = timed(lambda: scroll(frame))
+    gui.destroy()
+    return duration
+
+
+def render_frames():
+    for _ in range(RENDER_FRAMES):
+        base.graphics_engine.render_frame()
+
+
+def bench_render():
+    gui = WholeScreen(build_tree(args.width, args.depth), on_event=False)
+    base.task_mgr.step()
+    duration = timed(render_frames)
+    gui.destroy()
+    return duration
+
+
+def bench_render_static():
+    frame = StaticFrame(build_tree(args.width, args.depth))
+    gui = WholeScreen(frame, on_event=False)
+    # Let the batch be built.
+    base.task_mgr.step()
+    render_cost.update(frame.render_cost())
+    duration = timed(render_frames)
+    gui.destroy()
+    return duration
+
+
+def bench_render_scrolled():
+    # A long list scrolled to its middle, of which only a screenful of
+    # rows is in view.
+    frame = ScrollableFrame(row_list(args.rows))
+    gui = WholeScreen(frame, on_event=False)
+    base.task_mgr.step()
+    frame.np.verticalScroll['value'] = 0.5
+    base.task_mgr.step()
+    duration = timed(render_frames)
+    gui.destroy()
+    return duration
+
+
+def frames_after_cycles(cycles):
+    tasks = len(base.task_mgr.getAllTasks())
+    for _ in range(cycles):
+        gui = WholeScreen(build_tree(2, 2), deferred=True, stats=True)
+        base.task_mgr.step()
+        gui.destroy()
+    # Anything left behind would make every later frame more expensive.
+    assert len(base.task_mgr.getAllTasks()) == tasks, "cycles leaked tasks"
+
+    def frames():
+        for _ in range(RENDER_FRAMES):
+            base.messenger.send('aspectRatioChanged')
+            base.task_mgr.step()
+    return timed(frames)
+
+
+def bench_cycles_none():
+    return frames_after_cycles(0)
+
+
+def bench_cycles():
+    return frames_after_cycles(CYCLES)
+
+
+def lay_out_table(make_table):
+    table = make_table()
+    # Building the cells leaves enough garbage to trigger a collection
+    # inside the timed solves otherwise.
+    gc.collect()
+
+    def lay_out():
+        for aspect_ratio in ASPECT_RATIOS:
+            solve(table, 2.0 * aspect_ratio, 2.0)
+    return timed(lay_out)
+
+
+def bench_table_nested():
+    return lay_out_table(nested_table)
+
+
+def bench_table_grid():
+    return lay_out_table(grid_table)
+
+
+def write_description(directory):
+    path = os.path.join(directory, 'tree.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dump(build_tree(args.width, args.depth)), f)
+    return path, os.path.join(directory, 'cache')
+
+
+def bench_load_description():
+    with tempfile.TemporaryDirectory() as directory:
+        path, _ = write_description(directory)
+        return timed(lambda: Builder().build(load_compiled(path)))
+
+
+def bench_load_cached():
+    with tempfile.TemporaryDirectory() as directory:
+        path, cache_dir = write_description(directory)
+        load_compiled(path, cache_dir)
+        return timed(lambda: Builder().build(load_compiled(path, cache_dir)))
+
+
+BENCHMARKS = dict(
+    build=bench_build,
+    create=bench_create,
+    create_lazy=bench_create_lazy,
+    resize=bench_resize,
+    resize_text=bench_resize_text,
+    resize_unchanged=bench_resize_unchanged,
+    resize_indexed=bench_resize_indexed,
+    element_at=bench_element_at,
+    add_remove=bench_add_remove,
+    replace_leaf=bench_replace_leaf,
+    destroy=bench_destroy,
+    scroll=bench_scroll,
+    scroll_virtual=bench_scroll_virtual,
+    render=bench_render,
+    render_static=bench_render_static,
+    render_scrolled=bench_render_scrolled,
+    table_nested=bench_table_nested,
+    table_grid=bench_table_grid,
+    cycles_none=bench_cycles_none,
+    cycles=bench_cycles,
+    load_description=bench_load_description,
+    load_cached=bench_load_cached,
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ShowBase()
+    names = args.only if args.only else list(BENCHMARKS)
+    results = dict()
+    for name in names:
+        times = [BENCHMARKS[name]() for _ in range(args.repeat)]
+        results[name] = dict(
+            min=min(times),
+            median=statistics.median(times),
+            mean=statistics.mean(times),
+            times=times,
+        )
+        print(f"{name:20} {results[name]['median'] * 1000.0:10.3f} ms",
+              file=sys.stderr)
+    if render_cost:
+        print(f"render cost          {render_cost}", file=sys.stderr)
+
+    report = dict(
+        meta=dict(
+            unit='seconds',
+            commit=git_commit(),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            width=args.width,
+            depth=args.depth,
+            repeat=args.repeat,
+            mutations=args.mutations,
+            rows=args.rows,
+            window_type=args.window_type,
+            render_cost=render_cost,
+        ),
+        results=results,
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
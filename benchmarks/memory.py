@@ -0,0 +1,116 @@
+"""
+Memory used by the Python side of metagui trees, per node.
+
+    python benchmarks/memory.py --output memory.json
+    python benchmarks/compare.py before.json memory.json
+
+Each kind of node is built `--count` times without creating any widgets,
+and the memory allocated for it is measured with `tracemalloc`. Results
+are in bytes per node, in the same format as those of
+`benchmarks/main.py`, so `compare.py` works on them too.
+"""
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+
+from direct.gui.DirectGui import DirectLabel
+
+from metagui.gui import SizeSpec
+from metagui.gui import HorizontalFrame
+from metagui.gui import VerticalFrame
+from metagui.gui import Element
+from metagui.gui import Empty
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=50000,
+                        help="nodes to build per measurement")
+    parser.add_argument('--output', default=None,
+                        help="file to write results to, instead of stdout")
+    return parser.parse_args()
+
+
+def size_spec(idx):
+    return SizeSpec(w_min=idx * 0.001, h_min=0.1, h_weight=0.0)
+
+
+def default_size_spec(idx):
+    return SizeSpec()
+
+
+def empty(idx):
+    return Empty(SizeSpec(w_min=idx * 0.001))
+
+
+def element(idx):
+    return Element(
+        DirectLabel,
+        kwargs=dict(text=str(idx)),
+        size_spec=SizeSpec(w_min=idx * 0.001),
+    )
+
+
+def frame(idx):
+    return HorizontalFrame(Empty(), VerticalFrame(Empty()))
+
+
+def measured_frame(idx):
+    # As in a live tree, where every frame's size has been computed.
+    node = frame(idx)
+    node.get_size()
+    return node
+
+
+NODES = dict(
+    size_spec=size_spec,
+    default_size_spec=default_size_spec,
+    empty=empty,
+    element=element,
+    nested_frames=frame,
+    measured_frames=measured_frame,
+)
+
+
+def bytes_per_node(factory, count):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    nodes = [factory(idx) for idx in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list holding the nodes is not part of them.
+    return (after - before - sys.getsizeof(nodes)) / count
+
+
+def main():
+    args = parse_args()
+    results = dict()
+    for name, factory in NODES.items():
+        per_node = bytes_per_node(factory, args.count)
+        results[name] = dict(
+            min=per_node,
+            median=per_node,
+            mean=per_node,
+        )
+        print(f"{name:20} {per_node:10.1f} bytes", file=sys.stderr)
+
+    report = dict(
+        meta=dict(
+            unit='bytes',
+            python=platform.python_version(),
+            platform=platform.platform(),
+            count=args.count,
+        ),
+        results=results,
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -62,7 +62,7 @@ if __name__ == '__main__':
             size_spec=SizeSpec(),
         ),
     )
-    gui = WholeScreen(container)
+    gui = WholeScreen(container, deferred=True)
 
     def add_element(idx):
         element = Element(
@@ -83,12 +83,10 @@ if __name__ == '__main__':
         )
 
         container.add(idx, element)
-        gui.resize()
         print(f'+{idx}')
 
     def remove_element(idx):
         container.remove(idx)
-        gui.resize()
         print(f'-{idx}')
 
     base.accept('0', add_element, extraArgs=[0])
@@ -0,0 +1,80 @@
+import sys
+
+from panda3d.core import TextNode
+from direct.showbase.ShowBase import ShowBase
+from direct.gui.DirectGui import DirectLabel
+
+from metagui.gui import SizeSpec
+from metagui.gui import WholeScreen
+from metagui.gui import HorizontalFrame
+from metagui.gui import Element
+from metagui.gui import VirtualScrollableFrame
+
+
+class Application(ShowBase):
+    def __init__(self):
+        ShowBase.__init__(self)
+        # Basics
+        base.disable_mouse()
+
+        # Escape for Quit
+        base.accept('escape', sys.exit)
+
+        # F10 for frame rate meter
+        base.frame_rame_meter_visible = False
+        base.set_frame_rate_meter(base.frame_rame_meter_visible)
+        def toggle_frame_rate_meter():
+            base.frame_rame_meter_visible = not base.frame_rame_meter_visible
+            base.set_frame_rate_meter(base.frame_rame_meter_visible)
+        base.accept('f10', toggle_frame_rate_meter)
+
+        # F11 for debug
+        def debug():
+            import pdb; pdb.set_trace()
+        base.accept('f11', debug)
+
+
+if __name__ == '__main__':
+    Application()
+
+    def row_factory():
+        return HorizontalFrame(
+            Element(
+                DirectLabel,
+                kwargs=dict(
+                    text="",
+                    text_pos=(0.02, -0.02),
+                    text_align=TextNode.ALeft,
+                    text_scale=0.07,
+                    frameColor=(0.9, 0.9, 0.9, 1),
+                ),
+                size_spec=SizeSpec(w_min=0.8, w_weight=0.0),
+            ),
+            Element(
+                DirectLabel,
+                kwargs=dict(
+                    text="",
+                    text_pos=(0.02, -0.02),
+                    text_align=TextNode.ALeft,
+                    text_scale=0.07,
+                    frameColor=(0.75, 0.75, 0.75, 1),
+                ),
+            ),
+        )
+
+    def bind_row(row, item):
+        idx, score = item
+        row.children[0].np['text'] = f"#{idx}"
+        row.children[1].np['text'] = f"{score} points"
+
+    # A hundred thousand rows, but only those on screen have widgets.
+    leaderboard = [(idx, 100000 - idx) for idx in range(100000)]
+    gui = WholeScreen(
+        VirtualScrollableFrame(
+            leaderboard,
+            row_factory,
+            bind_row,
+            SizeSpec(h_min=0.1, h_weight=0.0),
+        ),
+    )
+    base.run()
@@ -0,0 +1,160 @@
+from panda3d.core import NodePath
+from panda3d.core import TransformState
+from panda3d.core import GeomNode
+from panda3d.core import TextNode
+from panda3d.core import PGItem
+from panda3d.core import PGWaitBar
+
+
+# Widgets whose `PGItem` is exactly one of these can have their geometry
+# baked into a batch, if they don't react to the mouse and only ever
+# show one state; See `is_static`. Everything else (buttons, entries,
+# sliders, scrolled frames, ...) stays live, along with everything
+# beneath it.
+STATIC_ITEM_TYPES = (PGItem, PGWaitBar)
+
+
+def is_static(item):
+    """
+    Whether the `PGItem` of a widget looks the same and ignores the
+    mouse for as long as it is left alone. A `DirectFrame` or
+    `DirectLabel` made with `state=DGG.NORMAL`, e.g. to `bind` a tooltip
+    to it, is active, and so not static.
+    """
+    if type(item) not in STATIC_ITEM_TYPES or item.get_active():
+        return False
+    current = item.get_state()
+    return all(
+        state == current or item.get_state_def(state).get_num_children() == 0
+        for state in range(item.get_num_state_defs())
+    )
+
+
+def collect(np, copies, hidden, depth=0):
+    """
+    Find the static widgets beneath `np`. Those whose geometry is to be
+    batched are appended to `copies` as `(NodePath, depth)`, where depth
+    counts the static widgets they are nested in, and the topmost of
+    them, which have to be hidden once the batch is built, to `hidden`.
+    Widgets that are already hidden are skipped.
+
+    Returns whether there are interactive widgets beneath `np`. A
+    static widget with interactive ones beneath it is kept live, as
+    hiding it would hide them too.
+    """
+    interactive = False
+    for child in np.get_children():
+        node = child.node()
+        if node.is_overall_hidden():
+            continue
+        if not isinstance(node, PGItem):
+            if collect(child, copies, hidden, depth):
+                interactive = True
+            continue
+        if not is_static(node):
+            interactive = True
+            continue
+        inner_copies = []
+        inner_hidden = []
+        if collect(child, inner_copies, inner_hidden, depth + 1):
+            interactive = True
+            copies.extend(inner_copies)
+            hidden.extend(inner_hidden)
+        else:
+            copies.append((child, depth))
+            copies.extend(inner_copies)
+            hidden.append(child)
+    return interactive
+
+
+def bake_text(np):
+    """
+    Replace the `TextNode`s beneath `np` with the geometry they
+    generate, so that it can be flattened together with the rest.
+    """
+    for text_np in np.find_all_matches('**/+TextNode'):
+        text = text_np.node()
+        generated = text_np.get_parent().attach_new_node(text.generate())
+        # The text's own transform (e.g. its scale) is not baked into
+        # the generated geometry.
+        generated.set_transform(text_np.get_transform().compose(
+            TransformState.make_mat(text.get_transform()),
+        ))
+        generated.set_state(text_np.get_state())
+        text_np.remove_node()
+
+
+def geom_nodes(np):
+    """
+    The `GeomNode`s beneath `np`, in the order they are drawn in.
+    """
+    found = []
+    stack = [np]
+    while stack:
+        np = stack.pop()
+        if isinstance(np.node(), GeomNode):
+            found.append(np)
+        stack.extend(reversed(np.get_children()))
+    return found
+
+
+def build_batch(items, root, batch_np):
+    """
+    Copy what the widgets in `items` (as made by `collect`) currently
+    show to `batch_np`, placed as they are relative to `root`, and
+    flatten it into as few `Geom`s as their render states allow.
+
+    2D geometry is drawn in scene graph order, and merging all of it
+    would e.g. draw some frames over the text of others. As widgets
+    laid out next to each other don't overlap, the batch is made of
+    layers instead: The n-th `GeomNode` that widgets nested at the same
+    depth draw go to the same layer, and layers are drawn in order.
+    """
+    scratch = NodePath('scratch')
+    layers = dict()
+    for item_np, depth in items:
+        item = item_np.node()
+        holder = scratch.attach_new_node('batched item')
+        holder.set_transform(item_np.get_transform(root))
+        holder.set_state(item_np.get_state(root))
+        item.get_state_def(item.get_state()).copy_to(holder)
+        bake_text(holder)
+        for idx, geom_np in enumerate(geom_nodes(holder)):
+            transform = geom_np.get_transform(scratch)
+            state = geom_np.get_state(scratch)
+            layer = layers.setdefault((depth, idx), [])
+            layer.append((geom_np, transform, state))
+    for key in sorted(layers):
+        layer_np = batch_np.attach_new_node('batch layer')
+        for geom_np, transform, state in layers[key]:
+            geom_np.reparent_to(layer_np)
+            geom_np.set_transform(transform)
+            geom_np.set_state(state)
+        layer_np.flatten_strong()
+    scratch.remove_node()
+
+
+def render_cost(np):
+    """
+    How many nodes the cull traversal visits beneath `np`, and how many
+    `Geom`s, roughly one draw call each, it will send to be rendered.
+    """
+    nodes = 0
+    geoms = 0
+    stack = [np]
+    while stack:
+        np = stack.pop()
+        node = np.node()
+        if node.is_overall_hidden():
+            continue
+        nodes += 1
+        if isinstance(node, GeomNode):
+            geoms += node.get_num_geoms()
+        elif isinstance(node, TextNode):
+            internal = NodePath(node.get_internal_geom())
+            for geom_np in internal.find_all_matches('**/+GeomNode'):
+                geoms += geom_np.node().get_num_geoms()
+        if isinstance(node, PGItem):
+            stack.append(node.get_state_def(node.get_state()))
+        stack.extend(np.get_children())
+    return dict(nodes=nodes, geoms=geoms)
@@ -0,0 +1,39 @@
+from direct.showbase.DirectObject import DirectObject
+
+
+def walk(root):
+    """
+    Yield `root` and all frames beneath it, depth first.
+    """
+    stack = [root]
+    while stack:
+        frame = stack.pop()
+        yield frame
+        stack.extend(
+            subframe
+            for subframe in reversed(frame.subframes())
+            if subframe is not None
+        )
+
+
+def find_leaks(frames):
+    """
+    Descriptions of whatever still keeps any of the destroyed `frames`
+    alive or on screen: Tasks running their methods, event handlers
+    they accept, and nodes they didn't remove.
+    """
+    owners = {id(frame): frame for frame in frames}
+    leaks = []
+    for task in base.task_mgr.getAllTasks():
+        owner = getattr(task.get_function(), '__self__', None)
+        if id(owner) in owners:
+            leaks.append(f"task {task.name!r} still runs for {owner!r}")
+    for frame in frames:
+        if isinstance(frame, DirectObject):
+            for event in frame.get_all_accepting():
+                leaks.append(f"{frame!r} still accepts {event!r}")
+        if frame.np is not None:
+            leaks.append(f"{frame!r} still has its node {frame.np}")
+        for np in getattr(frame, 'nps', ()):
+            leaks.append(f"{frame!r} still has the child node {np}")
+    return leaks
@@ -0,0 +1,439 @@
+"""
+Frame trees as data, so that screens can be kept in files instead of
+being built by nested constructor calls.
+
+A description is a JSON document:
+
+    {
+        "styles": {
+            "title": {"text_scale": 0.07, "frameColor": [1, 0, 0, 1]}
+        },
+        "root": {
+            "type": "VerticalFrame",
+            "children": [
+                {"type": "Element", "class": "DirectLabel",
+                 "style": "title", "kwargs": {"text": "Foo"},
+                 "size": [0.0, 1.0, 0.1, 0.0]},
+                {"type": "Empty"}
+            ]
+        }
+    }
+
+Nodes have a `type`, one of `HorizontalFrame`, `VerticalFrame`,
+`GridFrame`, `Element`, `Empty`, `ScrollableFrame`, `FixedFrame`,
+`StaticFrame` and `LazyFrame`. `HorizontalFrame` and `VerticalFrame`
+take `children` and a `weight`, `ScrollableFrame`, `FixedFrame`,
+`StaticFrame` and `LazyFrame` a `child`, and `FixedFrame` a `size` too.
+`LazyFrame` may take a `size`, and `visible` and `prewarm` flags. With a
+`size`, its subtree isn't even built until it is first shown or
+prewarmed; Otherwise it is built to be measured. `GridFrame` takes
+`cells`, each with a `child`, its `row` and `column`, and optionally a
+`row_span` and `column_span`. Sizes are `SizeSpec`s as
+`[w_min, w_weight, h_min, h_weight]`, or with `w_max` and `h_max`
+appended, where `null` means no maximum. An `Element` takes the name of
+its widget `class` (a DirectGUI one, or one passed as `classes`), and
+its keyword arguments are those of its `style`, updated by its
+`kwargs`. It may also take a `text_size`, `"fit"` or `"wrap"`. Values
+that can't be expressed in JSON, like a `command`, are written as
+`{"$": name}` and passed as `bindings` when building.
+
+Loading compiles a description into nested tuples, with styles already
+applied, from which trees can be built quickly any number of times.
+With a `cache_dir`, the compiled form is stored with `marshal`, and
+parsing is skipped until the file changes.
+"""
+import os
+from math import inf
+import json
+import marshal
+import hashlib
+
+from direct.gui import DirectGui
+
+from metagui.layout import SizeSpec
+from metagui.gui import SimplexFrame
+from metagui.gui import HorizontalFrame
+from metagui.gui import VerticalFrame
+from metagui.gui import GridFrame
+from metagui.gui import Element
+from metagui.gui import Empty
+from metagui.gui import ScrollableFrame
+from metagui.gui import FixedFrame
+from metagui.gui import StaticFrame
+from metagui.gui import LazyFrame
+
+
+# Changing the compiled form invalidates all caches.
+FORMAT_VERSION = 2
+
+
+def freeze(value):
+    """
+    JSON lists become tuples, which DirectGUI options usually are.
+    """
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict) and set(value) != {'$'}:
+        return {k: freeze(v) for k, v in value.items()}
+    return value
+
+
+def has_refs(value):
+    if isinstance(value, tuple):
+        return any(has_refs(v) for v in value)
+    if isinstance(value, dict):
+        return set(value) == {'$'} or any(has_refs(v) for v in value.values())
+    return False
+
+
+def compile_size(size):
+    if size is None:
+        return None
+    return tuple(inf if v is None else float(v) for v in size)
+
+
+def compile_node(node, styles):
+    kind = node['type']
+    if kind in ('HorizontalFrame', 'VerticalFrame'):
+        return (
+            kind,
+            float(node.get('weight', 1.0)),
+            tuple(compile_node(c, styles) for c in node.get('children', ())),
+        )
+    if kind == 'GridFrame':
+        return (
+            kind,
+            tuple(
+                (
+                    compile_node(c['child'], styles),
+                    int(c['row']),
+                    int(c['column']),
+                    int(c.get('row_span', 1)),
+                    int(c.get('column_span', 1)),
+                )
+                for c in node.get('cells', ())
+            ),
+        )
+    if kind == 'Element':
+        kwargs = dict(styles.get(node.get('style'), {}))
+        kwargs.update(node.get('kwargs', {}))
+        kwargs = tuple((k, freeze(v)) for k, v in kwargs.items())
+        return (
+            kind,
+            node['class'],
+            kwargs,
+            compile_size(node.get('size')),
+            has_refs(kwargs),
+            node.get('text_size'),
+        )
+    if kind == 'Empty':
+        return (kind, compile_size(node.get('size')))
+    if kind == 'ScrollableFrame':
+        return (
+            kind,
+            compile_node(node['child'], styles),
+            compile_size(node.get('size')),
+        )
+    if kind == 'FixedFrame':
+        return (
+            kind,
+            compile_node(node['child'], styles),
+            compile_size(node['size']),
+        )
+    if kind == 'StaticFrame':
+        return (kind, compile_node(node['child'], styles))
+    if kind == 'LazyFrame':
+        return (
+            kind,
+            compile_node(node['child'], styles),
+            compile_size(node.get('size')),
+            bool(node.get('visible', False)),
+            bool(node.get('prewarm', False)),
+        )
+    raise ValueError(f"Unknown node type {kind!r}")
+
+
+def compile_description(description):
+    """
+    Turn a description, as parsed from JSON, into its compiled form.
+    """
+    return compile_node(description['root'], description.get('styles', {}))
+
+
+def size_spec(size):
+    if size is None:
+        return None
+    return SizeSpec(*size)
+
+
+class Builder:
+    """
+    Builds frame trees from compiled descriptions.
+    """
+    def __init__(self, classes=None, bindings=None):
+        """
+        :classes:      Widget classes by name, in addition to those of
+                       DirectGUI.
+        :bindings:     Values by name, for `{"$": name}` in kwargs.
+        """
+        self.classes = classes or dict()
+        self.bindings = bindings or dict()
+        self.builders = dict(
+            HorizontalFrame=self.build_multi,
+            VerticalFrame=self.build_multi,
+            GridFrame=self.build_grid,
+            Element=self.build_element,
+            Empty=self.build_empty,
+            ScrollableFrame=self.build_scrollable,
+            FixedFrame=self.build_fixed,
+            StaticFrame=self.build_static,
+            LazyFrame=self.build_lazy,
+        )
+
+    def build(self, node):
+        return self.builders[node[0]](node)
+
+    def build_multi(self, node):
+        kind, weight, children = node
+        frame_cls = HorizontalFrame if kind == 'HorizontalFrame' else VerticalFrame
+        return frame_cls(*[self.build(c) for c in children], weight=weight)
+
+    def build_grid(self, node):
+        return GridFrame(*[
+            (self.build(child), *position)
+            for child, *position in node[1]
+        ])
+
+    def widget_class(self, name):
+        if name in self.classes:
+            return self.classes[name]
+        return getattr(DirectGui, name)
+
+    def build_element(self, node):
+        _, class_name, kwargs, size, refs, text_size = node
+        if refs:
+            kwargs = {k: self.bind(v) for k, v in kwargs}
+        else:
+            kwargs = dict(kwargs)
+        return Element(
+            self.widget_class(class_name),
+            kwargs=kwargs,
+            size_spec=size_spec(size),
+            text_size=text_size,
+        )
+
+    def bind(self, value):
+        if isinstance(value, tuple):
+            return tuple(self.bind(v) for v in value)
+        if isinstance(value, dict):
+            if set(value) == {'$'}:
+                return self.bindings[value['$']]
+            return {k: self.bind(v) for k, v in value.items()}
+        return value
+
+    def build_empty(self, node):
+        return Empty(size_spec(node[1]))
+
+    def build_scrollable(self, node):
+        _, child, size = node
+        return ScrollableFrame(self.build(child), size_spec=size_spec(size))
+
+    def build_fixed(self, node):
+        _, child, size = node
+        return FixedFrame(self.build(child), size_spec(size))
+
+    def build_static(self, node):
+        return StaticFrame(self.build(node[1]))
+
+    def build_lazy(self, node):
+        _, child, size, visible, prewarm = node
+        return LazyFrame(
+            LazyBuild(self, child),
+            size_spec=size_spec(size),
+            visible=visible,
+            prewarm=prewarm,
+        )
+
+
+class LazyBuild(SimplexFrame):
+    """
+    Stands in for a subtree that isn't built from its compiled form
+    until it is measured or created for the first time.
+    """
+    __slots__ = ('builder', 'compiled')
+
+    def __init__(self, builder, compiled):
+        SimplexFrame.__init__(self, None)
+        self.builder = builder
+        self.compiled = compiled
+
+    def build(self):
+        if self.child is None:
+            self.child = self.builder.build(self.compiled)
+            self.builder = None
+            self.compiled = None
+        return self.child
+
+    def create(self, parent, parent_np):
+        self.build()
+        SimplexFrame.create(self, parent, parent_np)
+
+    def get_size(self):
+        return self.build().get_size()
+
+    def subframes(self):
+        if self.child is None:
+            return []
+        return [self.child]
+
+
+def cache_path(path, cache_dir):
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, digest + '.mgc')
+
+
+def load_compiled(path, cache_dir=None):
+    """
+    The compiled form of the description in the file at `path`; From
+    the cache if it is up to date.
+    """
+    stat = os.stat(path)
+    key = (FORMAT_VERSION, stat.st_mtime_ns, stat.st_size)
+    if cache_dir is not None:
+        cached = cache_path(path, cache_dir)
+        try:
+            with open(cached, 'rb') as f:
+                cached_key, compiled = marshal.loads(f.read())
+            if cached_key == key:
+                return compiled
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    with open(path, encoding='utf-8') as f:
+        compiled = compile_description(json.load(f))
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cached, 'wb') as f:
+            marshal.dump((key, compiled), f)
+    return compiled
+
+
+class Screen:
+    """
+    A description file. It is read when the first tree is built from
+    it, so that loading many screens up front costs next to nothing.
+
+        menu = Screen('menu.json', cache_dir='.metagui-cache')
+        gui = WholeScreen(menu.build(bindings=dict(quit=sys.exit)))
+    """
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.compiled = None
+
+    def build(self, classes=None, bindings=None):
+        """
+        A new frame tree, as described by the file.
+        """
+        if self.compiled is None:
+            self.compiled = load_compiled(self.path, self.cache_dir)
+        return Builder(classes, bindings).build(self.compiled)
+
+
+def thaw(value, names):
+    """
+    The JSON form of a kwargs value, with values that have a name in
+    `names` written as references to it.
+    """
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if id(value) in names:
+        return {'$': names[id(value)]}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v, names) for v in value]
+    if isinstance(value, dict):
+        return {k: thaw(v, names) for k, v in value.items()}
+    raise TypeError(f"Can't describe {value!r}; Pass it as a binding.")
+
+
+def dump_size(size):
+    dumped = [size.w_min, size.w_weight, size.h_min, size.h_weight]
+    if size.w_max < inf or size.h_max < inf:
+        dumped += [
+            None if size.w_max == inf else size.w_max,
+            None if size.h_max == inf else size.h_max,
+        ]
+    return dumped
+
+
+def dump_node(frame, names):
+    kind = type(frame).__name__
+    if type(frame) in (HorizontalFrame, VerticalFrame):
+        return {
+            'type': kind,
+            'weight': frame.weight,
+            'children': [dump_node(c, names) for c in frame.children],
+        }
+    if type(frame) is GridFrame:
+        return {
+            'type': kind,
+            'cells': [
+                {
+                    'child': dump_node(child, names),
+                    'row': cell.row,
+                    'column': cell.column,
+                    'row_span': cell.row_span,
+                    'column_span': cell.column_span,
+                }
+                for child, cell in zip(frame.children, frame.cells)
+            ],
+        }
+    if type(frame) is Element:
+        dumped = {
+            'type': kind,
+            'class': frame.element_cls.__name__,
+            'kwargs': {k: thaw(v, names) for k, v in frame.kwargs.items()},
+            'size': dump_size(frame.size_spec),
+        }
+        if frame.text_size is not None:
+            dumped['text_size'] = frame.text_size
+        return dumped
+    if type(frame) is Empty:
+        return {'type': kind, 'size': dump_size(frame.size_spec)}
+    if type(frame) is ScrollableFrame:
+        return {
+            'type': kind,
+            'child': dump_node(frame.child, names),
+            'size': dump_size(frame.size_spec),
+        }
+    if type(frame) is FixedFrame:
+        return {
+            'type': kind,
+            'child': dump_node(frame.child, names),
+            'size': dump_size(frame.size_spec),
+        }
+    if type(frame) is StaticFrame:
+        return {'type': kind, 'child': dump_node(frame.child, names)}
+    if type(frame) is LazyFrame:
+        child = frame.child
+        if type(child) is LazyBuild:
+            child = child.build()
+        dumped = {
+            'type': kind,
+            'child': dump_node(child, names),
+            'visible': frame.visible,
+            'prewarm': frame.prewarm,
+        }
+        if frame.size_spec is not None:
+            dumped['size'] = dump_size(frame.size_spec)
+        return dumped
+    raise TypeError(f"Can't describe frames of type {kind}")
+
+
+def dump(frame, bindings=None):
+    """
+    The description of a frame tree, ready for `json.dump`. Values in
+    `bindings` are written as references to their names.
+    """
+    names = {id(v): k for k, v in (bindings or dict()).items()}
+    return {'root': dump_node(frame, names)}
@@ -1,49 +1,213 @@
+import warnings
+from time import perf_counter
+from bisect import bisect_left
+from bisect import bisect_right
+from contextlib import contextmanager
+from collections import deque
+
 from panda3d.core import TextNode
 
 from direct.gui.DirectGui import DirectLabel
 from direct.gui.DirectGui import DirectFrame
 from direct.gui.DirectGui import DirectScrolledFrame
+from direct.showbase.DirectObject import DirectObject
+
+from metagui.layout import SizeSpec
+from metagui.layout import measure_horizontal
+from metagui.layout import measure_vertical
+from metagui.layout import arrange_horizontal
+from metagui.layout import arrange_vertical
+from metagui.layout import GridCell
+from metagui.layout import measure_grid
+from metagui.layout import arrange_grid
+from metagui.layout import vectorize_grid
+from metagui.layout import fit
+from metagui.layout import fit_canvas
+from metagui.layout import solve
+from metagui.layout import vectorize
+from metagui.stats import LayoutStats
+from metagui.batch import collect
+from metagui.batch import build_batch
+from metagui.batch import render_cost
+from metagui.debug import walk
+from metagui.debug import find_leaks
+from metagui.text import text_measurer
+from metagui.spatial import SpatialGrid
+from metagui.spatial import contains
+from metagui.spatial import intersects
+from metagui.spatial import intersection
+
+
+class PushUpDirty:
+    __slots__ = ()
+
+    def mark_dirty(self):
+        self.invalidate_size()
+        self.rect = None
+        self.parent.mark_dirty()
+
+    def mark_boundary_dirty(self, boundary, relayout=True):
+        """
+        Pass on the report of a `LayoutBoundary` to the `WholeScreen`.
+        Nothing outside the boundary changes, so this frame doesn't.
+        """
+        self.parent.mark_boundary_dirty(boundary, relayout)
+
 
+class RedrawOnDirty:
+    __slots__ = ()
+
+    def mark_dirty(self):
+        self.resize('dirty')
+
+
+class LayoutBoundary:
+    """
+    For frames whose `SizeSpec` doesn't depend on what is inside them,
+    so that no change inside them can affect anything outside. Instead
+    of marking their parents dirty, they have the `WholeScreen` lay out
+    only their own subtree again, in the rectangle that they already
+    have. Frames keep that rectangle in `boundary_rect` meanwhile, and
+    may decide in `is_layout_boundary` whether they are a boundary.
+    """
+    __slots__ = ()
+
+    def is_layout_boundary(self):
+        return True
+
+    def mark_dirty(self):
+        self.report_change(True)
+
+    def invalidate(self):
+        self.report_change(False)
+
+    def report_change(self, relayout):
+        if self.is_layout_boundary():
+            if self.rect is not None:
+                self.boundary_rect = self.rect
+            if self.boundary_rect is not None:
+                self.invalidate_size()
+                self.rect = None
+                self.parent.mark_boundary_dirty(self, relayout)
+                return
+        # Not laid out yet, so this is up to the parent anyway.
+        if relayout:
+            PushUpDirty.mark_dirty(self)
+        else:
+            SimplexFrame.invalidate(self)
 
-class SizeSpec:
-    def __init__(self,
-                 w_min=0.0, w_weight=1.0,
-                 h_min=0.0, h_weight=1.0,
-                 ):
-        self.w_min = w_min
-        self.w_weight = w_weight
-        self.h_min = h_min
-        self.h_weight = h_weight
 
+class SimplexFrame(PushUpDirty):
+    # Frames are numerous, so they use slots instead of a `__dict__`.
+    # Subclasses without `__slots__` of their own get a `__dict__` again.
+    __slots__ = ('child', 'parent', 'np', 'stats', 'rect', 'stats_name')
 
-class SimplexFrame:
     def __init__(self, child):
         self.child = child
+        self.parent = None
+        self.np = None
+        # The `LayoutStats` of the tree, if it is collecting any. Set
+        # from the parent during `create`.
+        self.stats = None
+        # The last `(x, y, width, height)` applied to this frame by
+        # `apply_layout`, or `None` if it must be applied again.
+        self.rect = None
+        # If set, the time spent applying the layout of this subtree is
+        # reported to the tree's `LayoutStats` under this name.
+        self.stats_name = None
 
     def create(self, parent, parent_np):
         self.parent = parent
+        self.stats = parent.stats
+        self.init_layout_state()
         self.np = parent_np
         self.child.create(self, self.np)
 
+    def init_layout_state(self):
+        """
+        Subclasses may set up their child themselves instead of calling
+        `SimplexFrame.__init__`; Give them the layout state that it
+        initialises, unless they have already set it.
+        """
+        if not hasattr(self, 'rect'):
+            self.rect = None
+        if not hasattr(self, 'stats_name'):
+            self.stats_name = None
+
     def destroy(self):
+        # The NodePath belongs to the parent, which will remove it.
         self.child.destroy()
-        self.np.destroy_node()
         self.np = None
 
     def get_size(self):
         return self.child.get_size()
 
-    def resize(self, size_x, size_y):
-        self.child.resize(size_x, size_y)
+    def subframes(self):
+        """
+        The frames directly beneath this one.
+        """
+        return [self.child]
+
+    def invalidate_size(self):
+        """
+        Called on the way up from a dirty node. Frames that cache their
+        `SizeSpec` drop it here, so that it gets recomputed on the next
+        `get_size`.
+        """
+        pass
+
+    def invalidate(self):
+        """
+        Like `mark_dirty`, but without triggering a resize. This is for
+        frames that find out while their layout is being applied that
+        their size changed; The `WholeScreen` then does another pass.
+        """
+        self.invalidate_size()
+        self.rect = None
+        self.parent.invalidate()
+
+    def layout_children(self, width, height):
+        """
+        `(child, rect)` pairs for the children, given this frame's size.
+        """
+        return [(self.child, (0.0, 0.0, width, height))]
+
+    def place_child(self, index, x, y):
+        """
+        Move the child at `index` to `(x, y)`. Only containers that give
+        their children their own `NodePath` need to do anything here.
+        """
+        pass
+
+    def apply_size(self, width, height):
+        """
+        Update this frame's own widgets for its new size; Its children
+        are taken care of separately by `apply_layout`.
+        """
+        pass
+
+    def resize(self, width, height):
+        apply_layout(solve(self, width, height), self.stats)
 
 
 class MultiFrame(SimplexFrame):
+    __slots__ = (
+        'children', 'weight', 'parent_np', 'nps',
+        'size_cache', 'child_sizes', 'size_arrays',
+    )
+    # Whether `get_size` prepares `size_arrays` for wide containers.
+    vectorized = True
+
     def __init__(self, *children, weight=1.0):
+        SimplexFrame.__init__(self, None)
         self.children = list(children)
         self.weight = weight
+        self.size_cache = None
 
     def create(self, parent, parent_np):
         self.parent = parent
+        self.stats = parent.stats
+        self.init_layout_state()
         self.parent_np = parent_np
         self.nps = [
             parent_np.attach_new_node(repr(self))
@@ -58,40 +222,135 @@ class MultiFrame(SimplexFrame):
         self.children = []
 
         for np in self.nps:
-            np.destroy_node()
+            np.remove_node()
         self.nps = []
 
+    def init_layout_state(self):
+        SimplexFrame.init_layout_state(self)
+        if not hasattr(self, 'size_cache'):
+            self.size_cache = None
+
+    def subframes(self):
+        return list(self.children)
+
     def get_size(self):
-        raise NotImplemented
+        """
+        The `SizeSpec` is computed only once and then kept until this
+        frame or one of its descendants is marked dirty.
+        """
+        if self.stats is not None:
+            self.stats.count('get_size')
+        if self.size_cache is None:
+            if self.stats is not None:
+                self.stats.count('measure')
+            self.child_sizes = [c.get_size() for c in self.children]
+            if self.vectorized:
+                self.size_arrays = vectorize(self.child_sizes)
+            else:
+                self.size_arrays = None
+            self.size_cache = self.compute_size()
+        return self.size_cache
+
+    def compute_size(self):
+        """
+        Compute the `SizeSpec` from `self.child_sizes`, and from
+        `self.size_arrays` if the container is wide enough to have them.
+        """
+        raise NotImplementedError
+
+    def invalidate_size(self):
+        self.size_cache = None
+
+    def arrange(self, width, height):
+        """
+        Rectangles for the children, based on their measured sizes.
+        """
+        raise NotImplementedError
+
+    def layout_children(self, width, height):
+        return list(zip(self.children, self.arrange(width, height)))
 
-    def resize(self, size_x, size_y):
-        raise NotImplemented
+    def place_child(self, index, x, y):
+        self.nps[index].set_pos(x, 0, y)
 
     def add(self, idx, child):
         assert 0 <= idx <= len(self.children)
-        self.children.insert(idx, child)
-        np = self.parent_np.attach_new_node(repr(self))
-        self.nps.insert(idx, np)
-        child.create(self, np)
-        self.mark_dirty()
+        self.splice(idx, idx, [child])
 
     def remove(self, idx):
         assert 0 <= idx <= len(self.children) - 1
-        child = self.children.pop(idx)
-        child.destroy()
-        np = self.nps.pop(idx)
-        np.remove_node()
-        self.mark_dirty()
+        self.splice(idx, idx + 1, [])
 
+    def add_many(self, idx, children):
+        assert 0 <= idx <= len(self.children)
+        self.splice(idx, idx, children)
 
-class PushUpDirty:
-    def mark_dirty(self):
-        self.parent.mark_dirty()
+    def remove_range(self, start, stop):
+        assert 0 <= start <= stop <= len(self.children)
+        self.splice(start, stop, [])
 
+    def replace(self, children):
+        self.splice(0, len(self.children), children)
 
-class RedrawOnDirty:
-    def mark_dirty(self):
-        self.resize()
+    def clear(self):
+        self.splice(0, len(self.children), [])
+
+    def splice(self, start, stop, children):
+        """
+        Destroy the children in `start:stop`, and create `children` in
+        their place. This is done with one slice assignment per list,
+        and reported with a single `mark_dirty`, so it is much cheaper
+        than adding or removing the children one by one.
+        """
+        children = list(children)
+        if start == stop and not children:
+            return
+        for child in self.children[start:stop]:
+            child.destroy()
+        for np in self.nps[start:stop]:
+            np.remove_node()
+        nps = [
+            self.parent_np.attach_new_node(repr(self))
+            for c in children
+        ]
+        self.children[start:stop] = children
+        self.nps[start:stop] = nps
+        for child, np in zip(children, nps):
+            child.rect = None
+            child.create(self, np)
+        self.mark_dirty()
+
+
+def apply_layout(table, stats=None):
+    """
+    Push a table of `Placement`s made by `metagui.layout.solve` to the
+    scene graph. Only what changed since a frame's last placement is
+    applied: Its parent moves it if its position changed, and it
+    updates its own widgets if its size changed.
+    """
+    if stats is not None:
+        # Timers of named subtrees that we are currently in.
+        timed = []
+    for node, parent, index, depth, x, y, width, height, _, _ in table:
+        if stats is not None:
+            while timed and timed[-1][0] >= depth:
+                stats.stop(timed.pop()[1])
+            if node.stats_name is not None:
+                stats.start(node.stats_name)
+                timed.append((depth, node.stats_name))
+
+        rect = node.rect
+        if rect is None or rect[0] != x or rect[1] != y:
+            if parent is not None:
+                parent.place_child(index, x, y)
+        if rect is None or rect[2] != width or rect[3] != height:
+            if stats is not None:
+                stats.count('resize')
+            node.apply_size(width, height)
+        node.rect = (x, y, width, height)
+    if stats is not None:
+        while timed:
+            stats.stop(timed.pop()[1])
 
 
 """
@@ -99,7 +358,251 @@ class RedrawOnDirty:
 """
 
 
-class WholeScreen(SimplexFrame, RedrawOnDirty):
+# The default sort of the layout task; After the default sort of 0 for
+# game logic, intervals (20) and collisions (30), but before `igLoop`
+# (50) renders the frame.
+LAYOUT_TASK_SORT = 48
+
+# How often `WholeScreen.resize` lays the tree out again if frames report
+# that their size changed while it was applied.
+MAX_LAYOUT_PASSES = 3
+
+# How `WholeScreen` reacts to `aspectRatioChanged` events.
+RESIZE_POLICIES = ('immediate', 'frame', 'settle', 'scale')
+
+
+# The cell size of the spatial index of a `WholeScreen`; About the size
+# of a small widget.
+INDEX_CELL_SIZE = 0.1
+
+
+class LayoutIndex:
+    """
+    Where the widgets of a laid out tree are, for `WholeScreen.element_at`
+    and `WholeScreen.query`. `Element`s and `ScrollableFrame`s are kept
+    in `SpatialGrid`s: One for the screen, and one for the canvas of each
+    `ScrollableFrame`, in the canvas' coordinates, so that scrolling
+    doesn't change them. Rows of a `VirtualScrollableFrame` come and go
+    while scrolling, so they are looked at when needed instead.
+
+    The index is updated with every table made by `solve`, before it is
+    applied, while frames still have their old `rect`s: Subtrees that
+    weren't laid out again are only moved if they moved, and children
+    that a container no longer lays out are dropped.
+    """
+    def __init__(self, cell_size=INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        # By space; `None` for the screen, frames for their canvas.
+        self.grids = {None: SpatialGrid(cell_size)}
+        # `(space, left, top, width, height)` of every frame.
+        self.placed = dict()
+        # The children that containers laid out last time.
+        self.children = dict()
+
+    def clear(self):
+        self.grids = {None: SpatialGrid(self.cell_size)}
+        self.placed.clear()
+        self.children.clear()
+
+    def origin(self, parent):
+        """
+        The space that the children of `parent` are in, and where in it
+        their coordinates start.
+        """
+        if isinstance(parent, ScrollableFrame):
+            return parent, 0.0, 0.0
+        placed = self.placed.get(parent)
+        if placed is None:
+            # The `WholeScreen`
+            return None, 0.0, 0.0
+        return placed[:3]
+
+    def place(self, frame, space, left, top, width, height):
+        self.placed[frame] = (space, left, top, width, height)
+        if isinstance(frame, (Element, ScrollableFrame)):
+            grid = self.grids.get(space)
+            if grid is None:
+                grid = self.grids[space] = SpatialGrid(self.cell_size)
+            grid.insert(frame, (left, top, width, height))
+
+    def forget(self, frame):
+        """
+        Drop `frame` and everything beneath it.
+        """
+        stack = [frame]
+        while stack:
+            frame = stack.pop()
+            placed = self.placed.pop(frame, None)
+            if placed is not None and placed[0] in self.grids:
+                self.grids[placed[0]].remove(frame)
+            self.grids.pop(frame, None)
+            stack.extend(self.children.pop(frame, ()))
+
+    def move(self, frame, dx, dy):
+        """
+        Move everything beneath `frame` in the same space by `dx, dy`.
+        """
+        if isinstance(frame, ScrollableFrame):
+            return
+        stack = list(self.children.get(frame, ()))
+        while stack:
+            frame = stack.pop()
+            space, left, top, width, height = self.placed[frame]
+            self.place(frame, space, left + dx, top + dy, width, height)
+            if not isinstance(frame, ScrollableFrame):
+                stack.extend(self.children.get(frame, ()))
+
+    def restore(self, frame):
+        """
+        Place everything beneath `frame`, which has already been laid
+        out, from its current layout; E.g. a subtree that was hidden and
+        is shown again at the same size.
+        """
+        stack = [frame]
+        while stack:
+            frame = stack.pop()
+            _, _, _, width, height = self.placed[frame]
+            space, left, top = self.origin(frame)
+            children = []
+            for child, (x, y, c_width, c_height) in frame.layout_children(
+                width,
+                height,
+            ):
+                self.place(child, space, left + x, top + y, c_width, c_height)
+                children.append(child)
+            if children:
+                self.children[frame] = children
+            stack.extend(children)
+
+    def update(self, table):
+        parent = table[0].node.parent
+        if parent.parent is not None and parent not in self.placed:
+            # A layout boundary in a row of a `VirtualScrollableFrame`
+            return
+        laid_out = dict()
+        for placement in table[1:]:
+            laid_out.setdefault(placement.parent, []).append(placement.node)
+        for node, parent, _, _, x, y, width, height, _, _ in table:
+            space, left, top = self.origin(
+                node.parent if parent is None else parent
+            )
+            left += x
+            top += y
+            old = self.placed.get(node)
+            self.place(node, space, left, top, width, height)
+            rect = node.rect
+            if rect is not None and rect[2] == width and rect[3] == height:
+                # Not laid out again; See `solve`.
+                if old is None:
+                    self.restore(node)
+                elif old[1] != left or old[2] != top:
+                    self.move(node, left - old[1], top - old[2])
+                continue
+            children = laid_out.get(node)
+            old_children = self.children.get(node)
+            if old_children:
+                kept = set(children or ())
+                for child in old_children:
+                    if child not in kept:
+                        self.forget(child)
+            if children:
+                self.children[node] = children
+            elif old_children:
+                del self.children[node]
+
+    def viewport(self, frame):
+        _, left, top, _, _ = self.placed[frame]
+        return (left, top) + frame.viewport_size
+
+    def rows(self, frame):
+        """
+        The frames beneath the active rows of a `VirtualScrollableFrame`,
+        with their rectangles in its canvas.
+        """
+        for idx, (row, _) in frame.active_rows.items():
+            stack = [(row, frame.row_rect(idx))]
+            while stack:
+                subframe, rect = stack.pop()
+                yield subframe, rect
+                left, top, _, _ = rect
+                for child in subframe.subframes():
+                    if child is not None and child.rect is not None:
+                        x, y, width, height = child.rect
+                        stack.append((child, (left + x, top + y, width, height)))
+
+    def element_at(self, x, y, space_np):
+        """
+        The innermost `Element` or `ScrollableFrame` at the point, or
+        `None`. `space_np` is the node of the screen's space. Where
+        widgets overlap, like the content of a too small `FixedFrame`
+        and its neighbours, any of them may be found.
+        """
+        space = None
+        found = None
+        while True:
+            hits = [
+                frame
+                for frame in self.grids[space].at(x, y)
+                if frame.np is not None
+            ] if space in self.grids else []
+            if not hits and isinstance(space, VirtualScrollableFrame):
+                hits = [
+                    frame
+                    for frame, rect in self.rows(space)
+                    if isinstance(frame, Element) and contains(rect, x, y)
+                ]
+            if not hits:
+                return found
+            found = hits[-1]
+            if not isinstance(found, ScrollableFrame):
+                return found
+            if not contains(self.viewport(found), x, y):
+                # On a scroll bar.
+                return found
+            canvas = found.np.getCanvas()
+            origin = canvas.get_pos(space_np)
+            x -= origin.x
+            y -= origin.z
+            space = found
+            space_np = canvas
+
+    def query(self, rect, space_np, space=None):
+        """
+        All `Element`s and `ScrollableFrame`s that intersect `rect`, and
+        are not scrolled out of view.
+        """
+        found = []
+        if space in self.grids:
+            hits = self.grids[space].query(rect)
+        elif isinstance(space, VirtualScrollableFrame):
+            hits = [
+                frame
+                for frame, frame_rect in self.rows(space)
+                if isinstance(frame, Element) and intersects(frame_rect, rect)
+            ]
+        else:
+            hits = []
+        for frame in hits:
+            if frame.np is None:
+                continue
+            found.append(frame)
+            if not isinstance(frame, ScrollableFrame):
+                continue
+            visible = intersection(rect, self.viewport(frame))
+            if visible is None:
+                continue
+            canvas = frame.np.getCanvas()
+            origin = canvas.get_pos(space_np)
+            left, top, width, height = visible
+            found.extend(self.query(
+                (left - origin.x, top - origin.z, width, height),
+                canvas,
+                frame,
+            ))
+        return found
+
+
+class WholeScreen(SimplexFrame, RedrawOnDirty, DirectObject):
     """
     This class represents the root of a tree of frames. It offers 
     several ways to automate resizing the window tree.
@@ -116,26 +619,88 @@ class WholeScreen(SimplexFrame, RedrawOnDirty):
     """
     def __init__(self, child, name="whole screen",
                  on_event=True, on_dirty=True, task_args=None,
-                 delay_create=False):
+                 delay_create=False, deferred=False, stats=False,
+                 check_leaks=False, resize_policy='immediate',
+                 settle_time=0.2, on_task=False,
+                 task_sort=LAYOUT_TASK_SORT, spatial_index=False):
         """
         :child:        The tree in this frame.
         :name:         The name of the GUI's `NodePath`.
         :on_event:     An `aspectRatioChanged` event will trigger a
-                       resize. True by default.
+                       resize, as per :resize_policy:. True by default.
+        :resize_policy: While the window is being dragged to a new
+                       size, many `aspectRatioChanged` events arrive,
+                       often several per frame. With `'immediate'`
+                       (default), each causes a resize. With `'frame'`,
+                       there is at most one per frame, done by a task
+                       before rendering it. With `'settle'`, the resize
+                       is done once no event arrived for :settle_time:
+                       seconds; Until then the GUI keeps its old
+                       layout. `'scale'` is like `'settle'`, but in the
+                       meantime stretches the old layout to the window.
+        :settle_time:  See :resize_policy:. 0.2 seconds by default.
         :on_dirty:     The child can report that a change has occurred
                        within it that necessitates a resize. If
                        :on_dirty: is `True` (default), that resize will
                        be done immediately.
+        :deferred:     If `True`, reports of changes only set the dirty
+                       flag, and a task does one resize per frame
+                       before rendering it, no matter how many changes
+                       were reported. Use `flush()` to get the geometry
+                       immediately. False by default.
+        :on_task:      If `True`, the layout task runs every frame and
+                       checks whether the window's size changed, e.g.
+                       without an `aspectRatioChanged` event, or a
+                       change was reported; Only then it resizes.
+                       Window size changes are not checked while the
+                       `'settle'` or `'scale'` policy waits for the
+                       window to settle. False by default.
+        :task_sort:    The sort of the layout task, which is there if
+                       :on_task:, :deferred: or the `'frame'` resize
+                       policy call for it. `LAYOUT_TASK_SORT` by
+                       default; After game logic, before rendering.
         :task_args:    To create a task that triggers a resize every 
                        frame, pass an `(args, kwargs)` tuple with
                        arguments to pass to `base.task_mgr.add`. By
-                       default, no such task is created.
+                       default, no such task is created. Prefer
+                       :on_task:, which resizes only when needed.
+        :stats:        If `True`, collect layout statistics in
+                       `self.stats` (a `metagui.stats.LayoutStats`) and
+                       PStats. False by default.
+        :check_leaks:  A debugging aid; If `True`, `destroy()` warns
+                       about any task, event handler or node of the
+                       tree that is still alive after it is done.
+                       False by default.
+        :spatial_index: If `True`, keep an index of where the widgets
+                       are, updated with every layout, for
+                       `element_at()` and `query()`. False by default.
         """
         SimplexFrame.__init__(self, child)
 
         self.name = name
         self.on_event = on_event
         self.on_dirty = on_dirty
+        self.deferred = deferred
+        self.suspended = 0
+        self.check_leaks = check_leaks
+        if resize_policy not in RESIZE_POLICIES:
+            raise ValueError(f"Unknown resize policy {resize_policy!r}")
+        self.resize_policy = resize_policy
+        self.settle_time = settle_time
+        self.on_task = on_task
+        self.task_sort = task_sort
+        self.settle_task = None
+        self.window_changed = False
+        self.interim_scale = False
+        # `LayoutBoundary` frames whose subtree is to be laid out again,
+        # in the order they reported, as keys of a dict.
+        self.dirty_boundaries = dict()
+        if spatial_index:
+            self.index = LayoutIndex()
+        else:
+            self.index = None
+        if stats:
+            self.stats = LayoutStats(name)
         if task_args is None:
             self.by_task = False
         else:
@@ -154,114 +719,345 @@ class WholeScreen(SimplexFrame, RedrawOnDirty):
         the parameters to `__init__`.
         """
         self.np = base.a2dTopLeft.attach_new_node(self.name)
+        self.child.rect = None
         self.child.create(self, self.np)
         self.resize()
 
+        # Listeners and tasks are registered through `DirectObject`, so
+        # that each GUI has its own, and `destroy` can remove them all.
         if self.on_event:
-            base.accept('aspectRatioChanged', self.resize)
+            self.accept('aspectRatioChanged', self.window_resized)
+        if self.on_task or self.deferred or self.resize_policy == 'frame':
+            self.add_task(
+                self.update_layout,
+                f'{self.name} layout',
+                sort=self.task_sort,
+            )
         if self.by_task:
             args, kwargs = self.task_args
-            base.task_mgr.add(*args, **kwargs)
+            self.add_task(*args, **kwargs)
+        if self.stats is not None:
+            self.add_task(
+                self.stats.end_frame_task,
+                f'{self.name} stats',
+                sort=self.task_sort + 1,
+            )
 
     def destroy(self):
         """
+        Remove the event handler and tasks, then destroy all widgets and
+        nodes of the tree.
         """
+        if self.check_leaks:
+            frames = list(walk(self))
+        self.ignore_all()
+        self.remove_all_tasks()
+        self.settle_task = None
+        self.dirty_boundaries.clear()
+        if self.index is not None:
+            self.index.clear()
         self.child.destroy()
-        self.np.destroy()
+        self.np.remove_node()
         self.np = None
-
-        if self.on_event:
-            # FIXME: Unregister event listener
-            pass
-        if self.by_task:
-            # FIXME: Remove task
-            pass
+        if self.check_leaks:
+            for leak in find_leaks(frames):
+                warnings.warn(f"{self.name}: {leak}", RuntimeWarning)
 
     def get_size(self):
-        SimplexFrame.get_size(self)
-
-    def resize(self):
-        size = base.a2dTopRight.get_pos() - base.a2dBottomLeft.get_pos()
-        width = size.x
-        height = size.z
-
-        min_size = self.child.get_size()
-        if min_size.w_min > width or min_size.w_weight == 0.0:
-            width = min_size.w_min
-        if min_size.h_min > height or min_size.h_weight == 0.0:
-            height = min_size.h_min
+        return SimplexFrame.get_size(self)
 
-        SimplexFrame.resize(self, width, height)
+    def resize(self, source='explicit'):
+        """
+        :source:       What triggered the resize, for the statistics;
+                       `'event'`, `'dirty'`, `'task'` or `'explicit'`.
+        """
+        if self.stats is not None:
+            self.stats.count('relayouts:' + source)
+            self.stats.start('layout')
+        size = self.window_size()
+        if self.interim_scale:
+            self.np.set_scale(1)
+            self.interim_scale = False
         self.dirty = False
+        self.window_changed = False
+        for _ in range(MAX_LAYOUT_PASSES):
+            # Measure pass, then arrange pass.
+            width, height = fit(self.child.get_size(), size.x, size.z)
+            self.lay_out(self.child, width, height)
+            self.relayout_boundaries()
+            # Frames whose size depends on the space they got, like
+            # wrapped text, may have asked for another pass.
+            if not self.dirty:
+                break
+            self.dirty = False
+        self.laid_out_size = size
+        if self.stats is not None:
+            self.stats.stop('layout')
+
+    def window_size(self):
+        return base.a2dTopRight.get_pos() - base.a2dBottomLeft.get_pos()
+
+    def window_resized(self):
+        """
+        Handles `aspectRatioChanged` according to the resize policy.
+        """
+        if self.resize_policy == 'immediate':
+            self.resize('event')
+        elif self.resize_policy == 'frame':
+            self.window_changed = True
+        else:
+            if self.settle_task is not None:
+                self.remove_task(self.settle_task)
+            self.settle_task = self.do_method_later(
+                self.settle_time,
+                self.window_settled,
+                f'{self.name} settle',
+            )
+            if self.resize_policy == 'scale':
+                size = self.window_size()
+                self.np.set_scale(
+                    size.x / self.laid_out_size.x,
+                    1,
+                    size.z / self.laid_out_size.z,
+                )
+                self.interim_scale = True
+
+    def window_settled(self, task):
+        self.settle_task = None
+        self.resize('event')
+        return task.done
 
     def mark_dirty(self):
         self.dirty = True
-        if self.on_dirty:
+        if self.on_dirty and not self.deferred and not self.suspended:
             RedrawOnDirty.mark_dirty(self)
 
+    def invalidate(self):
+        self.dirty = True
+
+    def mark_boundary_dirty(self, boundary, relayout=True):
+        self.dirty_boundaries[boundary] = None
+        if relayout:
+            self.mark_dirty()
+        else:
+            self.invalidate()
+
+    def relayout_boundaries(self):
+        """
+        Lay out the subtrees of the `LayoutBoundary` frames that reported
+        a change, unless that was already done as part of their parent's
+        layout, or they were destroyed meanwhile.
+        """
+        boundaries = list(self.dirty_boundaries)
+        self.dirty_boundaries.clear()
+        for boundary in boundaries:
+            rect = boundary.boundary_rect
+            boundary.boundary_rect = None
+            if boundary.rect is not None or boundary.np is None:
+                continue
+            if self.stats is not None:
+                self.stats.count('relayouts:boundary')
+            x, y, width, height = rect
+            self.lay_out(boundary, width, height, x, y)
+
+    def lay_out(self, frame, width, height, x=0.0, y=0.0):
+        """
+        Lay out the subtree under `frame` and apply it, keeping the
+        spatial index up to date.
+        """
+        table = solve(frame, width, height, x, y)
+        if self.index is not None:
+            self.index.update(table)
+        apply_layout(table, self.stats)
+
+    def element_at(self, x, y):
+        """
+        The innermost `Element` (or `ScrollableFrame`, if there is no
+        element) at the point, or `None`. Coordinates are those of
+        `self.np`, like those of the layout; For the mouse:
+
+            mouse = base.mouseWatcherNode.get_mouse()
+            pos = gui.np.get_relative_point(
+                base.render2d, (mouse.x, 0, mouse.y),
+            )
+            frame = gui.element_at(pos.x, pos.z)
+
+        Requires `spatial_index`.
+        """
+        if self.index is None:
+            raise RuntimeError(f"{self.name} has no spatial index")
+        return self.index.element_at(x, y, self.np)
+
+    def query(self, rect):
+        """
+        All `Element`s and `ScrollableFrame`s that intersect `rect`, an
+        `(x, y, width, height)` tuple in the coordinates of `self.np`,
+        like those of the layout, with `x, y` being its top left corner.
+        Parts of scrollable frames that are scrolled out of view are
+        left out. Requires `spatial_index`.
+        """
+        if self.index is None:
+            raise RuntimeError(f"{self.name} has no spatial index")
+        return self.index.query(rect, self.np)
+
+    @contextmanager
+    def batch(self):
+        """
+        Within this context, reported changes do not trigger a resize.
+        If any were reported, they are handled once when it is left.
+
+            with gui.batch():
+                for idx, row in enumerate(rows):
+                    table.add(idx, row)
+        """
+        self.suspended += 1
+        try:
+            yield self
+        finally:
+            self.suspended -= 1
+            if self.dirty and not self.suspended:
+                self.mark_dirty()
+
+    def flush(self, source='explicit'):
+        """
+        Do a pending resize now instead of waiting for the layout task.
+        """
+        if self.dirty:
+            self.resize(source)
+
+    def update_layout(self, task):
+        if self.window_changed:
+            self.resize('event')
+        elif (self.on_task and self.settle_task is None
+              and self.window_size() != self.laid_out_size):
+            # While a resize policy waits for the window to settle, the
+            # size it is changing to is left to that policy.
+            self.resize('task')
+        elif self.on_dirty:
+            self.flush('task')
+        return task.cont
+
 
 class HorizontalFrame(MultiFrame, PushUpDirty):
-    def get_size(self):
-        child_sizes = [c.get_size() for c in self.children]
-        w_min = sum(c.w_min for c in child_sizes)
-        h_min = max(c.h_min for c in child_sizes)
-        w_weight = sum(c.w_weight for c in child_sizes)
-        h_weight = self.weight
-        return SizeSpec(
-            w_min=w_min,
-            h_min=h_min,
-            w_weight=w_weight,
-            h_weight=h_weight,
+    __slots__ = ()
+
+    def compute_size(self):
+        return measure_horizontal(
+            self.child_sizes,
+            self.weight,
+            self.size_arrays,
+        )
+
+    def arrange(self, width, height):
+        size = self.get_size()
+        return arrange_horizontal(
+            self.child_sizes,
+            size,
+            width,
+            height,
+            self.size_arrays,
         )
 
-    def resize(self, width, height):
-        child_sizes = [c.get_size() for c in self.children]
-        min_size = self.get_size()
-        if min_size.w_weight == 0.0:
-            flex_width_unit = 0.0
-        else:
-            flex_width_unit = (width - min_size.w_min) / min_size.w_weight
-        left = 0.0
-        for np, c, cs in zip(self.nps, self.children, child_sizes):
-            c_width = cs.w_min + flex_width_unit * cs.w_weight
-            c_height = height  # FIXME
-            np.set_pos(left, 0, 0)
-            c.resize(c_width, c_height)
-            left += c_width
-            
 
 class VerticalFrame(MultiFrame, PushUpDirty):
-    def get_size(self):
-        child_sizes = [c.get_size() for c in self.children]
-        w_min = max(c.w_min for c in child_sizes)
-        h_min = sum(c.h_min for c in child_sizes)
-        w_weight = self.weight
-        h_weight = sum(c.h_weight for c in child_sizes)
-        return SizeSpec(
-            w_min=w_min,
-            h_min=h_min,
-            w_weight=w_weight,
-            h_weight=h_weight,
+    __slots__ = ()
+
+    def compute_size(self):
+        return measure_vertical(
+            self.child_sizes,
+            self.weight,
+            self.size_arrays,
         )
 
-    def resize(self, width, height):
-        child_sizes = [c.get_size() for c in self.children]
-        min_size = self.get_size()
-        if min_size.h_weight == 0.0:
-            flex_height_unit = 0.0
-        else:
-            flex_height_unit = (height - min_size.h_min) / min_size.h_weight
-        top = 0.0
-        for np, c, cs in zip(self.nps, self.children, child_sizes):
-            c_width = width  # FIXME
-            c_height = cs.h_min + flex_height_unit * cs.h_weight
-            np.set_pos(0, 0, top)
-            c.resize(c_width, c_height)
-            top -= c_height
+    def arrange(self, width, height):
+        size = self.get_size()
+        return arrange_vertical(
+            self.child_sizes,
+            size,
+            width,
+            height,
+            self.size_arrays,
+        )
+
+
+def grid_cell(cell):
+    """
+    Split a `(child, row, column)` or `(child, row, column, row_span,
+    column_span)` tuple into the child and its `GridCell`.
+    """
+    child, *position = cell
+    position = GridCell(*position)
+    if (position.row < 0 or position.column < 0 or
+            position.row_span < 1 or position.column_span < 1):
+        raise ValueError(f"Invalid grid cell {position}")
+    return child, position
+
+
+class GridFrame(MultiFrame, PushUpDirty):
+    """
+    Children laid out in a grid, so that they line up in columns and
+    rows. Each is given as a `(child, row, column)` tuple, or with
+    `row_span` and `column_span` added, if it covers several cells:
+
+        GridFrame(
+            (title, 0, 0, 1, 2),
+            (name_label, 1, 0),
+            (name_entry, 1, 1),
+        )
+
+    A column is as wide as its widest child, and a row as high as its
+    highest; Additional space is shared out like in `HorizontalFrame`
+    and `VerticalFrame`. Cells may be left empty. `add`, `splice` etc.
+    also take cells as tuples.
+
+    Unlike nested frames, the grid measures and arranges all its
+    children at once, with a single level of nodes beneath it.
+    """
+    __slots__ = ('cells', 'columns', 'rows')
+    # `size_arrays` holds the `GridArrays` of wide grids instead.
+    vectorized = False
+
+    def __init__(self, *cells):
+        cells = [grid_cell(c) for c in cells]
+        MultiFrame.__init__(self, *[child for child, _ in cells])
+        self.cells = [position for _, position in cells]
+
+    def destroy(self):
+        MultiFrame.destroy(self)
+        self.cells = []
+
+    def compute_size(self):
+        size, self.columns, self.rows = measure_grid(
+            self.child_sizes,
+            self.cells,
+        )
+        self.size_arrays = vectorize_grid(self.child_sizes, self.cells)
+        return size
+
+    def arrange(self, width, height):
+        size = self.get_size()
+        return arrange_grid(
+            self.child_sizes,
+            self.cells,
+            self.columns,
+            self.rows,
+            size,
+            width,
+            height,
+            self.size_arrays,
+        )
+
+    def splice(self, start, stop, cells):
+        cells = [grid_cell(c) for c in cells]
+        self.cells[start:stop] = [position for _, position in cells]
+        MultiFrame.splice(self, start, stop, [child for child, _ in cells])
 
 
 class Empty(SimplexFrame):
+    __slots__ = ('size_spec',)
+
     def __init__(self, size_spec=None):
+        SimplexFrame.__init__(self, None)
         if size_spec is None:
             size_spec = SizeSpec()
         self.size_spec = size_spec
@@ -275,12 +1071,41 @@ class Empty(SimplexFrame):
     def get_size(self):
         return self.size_spec
 
+    def subframes(self):
+        return []
+
+    def layout_children(self, width, height):
+        return []
+
     def resize(sef, size_, size_y):
         pass
 
 
 class Element(SimplexFrame):
-    def __init__(self, element_cls, kwargs=None, size_spec=None):
+    __slots__ = (
+        'element_cls', 'kwargs', 'size_spec', 'pool', 'applied',
+        'text_size', 'text_spec', 'wrap_width',
+    )
+
+    def __init__(self, element_cls, kwargs=None, size_spec=None, pool=None,
+                 text_size=None):
+        """
+        :element_cls:  The DirectGUI class to create.
+        :kwargs:       Keyword arguments for `element_cls`.
+        :size_spec:    The `SizeSpec` of this element.
+        :pool:         An optional `metagui.pool.WidgetPool` to take the
+                       widget from, and to return it to on `destroy`.
+        :text_size:    Derive the minimal size from the text, so that
+                       it fits. With `'fit'`, the element is at least
+                       as large as its text (wrapped at `text_wordwrap`,
+                       if given) plus its `pad`. With `'wrap'`, the
+                       text is wrapped to the element's width, and only
+                       its height follows from that. :size_spec: still
+                       gives the weights, and minimums that the text
+                       can only raise. The text is also centered
+                       vertically, so `text_pos` is not needed.
+        """
+        SimplexFrame.__init__(self, None)
         self.element_cls = element_cls
         if kwargs is None:
             kwargs = dict()
@@ -292,79 +1117,948 @@ class Element(SimplexFrame):
         # label's boundaries. This solution is brittle AF.
         if 'text_align' not in self.kwargs:
             self.kwargs['text_align'] = TextNode.ALeft
+        self.pool = pool
+        # The options last written by `configure`, once created.
+        self.applied = None
+        self.text_size = text_size
+        self.text_spec = None
+        self.wrap_width = None
 
     def create(self, parent, parent_np):
         self.parent = parent
-        self.np = self.element_cls(
-            parent=parent_np,
-            **self.kwargs,
-        )
+        self.stats = parent.stats
+        if self.stats is not None:
+            self.stats.count('widgets_created')
+        if self.pool is None:
+            self.np = self.element_cls(
+                parent=parent_np,
+                **self.kwargs,
+            )
+        else:
+            self.np = self.pool.acquire(
+                self.element_cls,
+                self.kwargs,
+                parent_np,
+            )
+        self.applied = dict()
 
     def destroy(self):
-        self.np.destroy()
+        if self.stats is not None:
+            self.stats.count('widgets_destroyed')
+        if self.pool is None:
+            self.np.destroy()
+        else:
+            self.pool.release(self.element_cls, self.kwargs, self.np)
         self.np = None
 
     def get_size(self):
-        return self.size_spec
+        if self.text_size is None:
+            return self.size_spec
+        if self.text_spec is None:
+            extent = self.text_extent()
+            pad_x, pad_z = self.kwargs.get('pad', (0.0, 0.0))
+            spec = self.size_spec
+            w_min = spec.w_min
+            if self.text_size == 'fit':
+                w_min = max(w_min, extent.width + 2.0 * pad_x)
+            h_min = max(spec.h_min, extent.height + 2.0 * pad_z)
+            # The text wins over the maximum.
+            self.text_spec = SizeSpec.computed(
+                w_min=w_min,
+                w_weight=spec.w_weight,
+                h_min=h_min,
+                h_weight=spec.h_weight,
+                w_max=max(spec.w_max, w_min),
+                h_max=max(spec.h_max, h_min),
+            )
+        return self.text_spec
+
+    def invalidate_size(self):
+        self.text_spec = None
+
+    def text_extent(self):
+        """
+        The `metagui.text.TextExtent` of the element's text, as per its
+        kwargs; From the shared cache if it was measured before.
+        """
+        text = self.kwargs.get('text')
+        if isinstance(text, (list, tuple)):
+            # One text per state; The first is the normal one.
+            text = text[0] if text else None
+        if self.text_size == 'wrap':
+            wordwrap = self.wrap_width
+        else:
+            wordwrap = self.kwargs.get('text_wordwrap')
+        return text_measurer.measure(
+            text,
+            self.kwargs.get('text_font'),
+            self.kwargs.get('text_scale', 1.0),
+            wordwrap,
+        )
+
+    def set_text(self, text):
+        """
+        Change the text. If the element is sized to it, it is marked
+        dirty.
+        """
+        # `kwargs` is often a style dict shared with other elements, so
+        # it is replaced with a copy instead of being changed.
+        self.kwargs = dict(self.kwargs, text=text)
+        if self.np is not None:
+            self.configure(text=text)
+        if self.text_size is not None and self.parent is not None:
+            self.mark_dirty()
+
+    def subframes(self):
+        return []
+
+    def layout_children(self, width, height):
+        return []
+
+    def apply_size(self, width, height):
+        self.resize(width, height)
+
+    def configure(self, **options):
+        """
+        Apply DirectGUI options to the widget, skipping those that have
+        the same value as when they were last applied through this
+        method. The remaining ones are applied in a single `configure`
+        call, so that each of the widget's update functions (like the
+        frame geometry rebuild) runs at most once.
+
+        Options written to `self.np` directly bypass this bookkeeping;
+        after doing so, clear `self.applied` to force the next write.
+        """
+        changed = {
+            option: value
+            for option, value in options.items()
+            if option not in self.applied or self.applied[option] != value
+        }
+        if self.stats is not None:
+            self.stats.count('option_writes', len(changed))
+            self.stats.count('option_writes_skipped', len(options) - len(changed))
+        if changed:
+            self.np.configure(**changed)
+            self.applied.update(changed)
 
     def resize(self, width, height):
         self.np.set_pos(width / 2.0, 0, -height / 2.0)
-        self.np['frameSize'] = (-width / 2.0, width / 2.0, -height / 2.0, height / 2.0)
-        if self.np['text'] is not None:
+        options = dict(
+            frameSize=(-width / 2.0, width / 2.0, -height / 2.0, height / 2.0),
+        )
+        if self.text_size is not None:
+            options.update(self.text_options(width, height))
+        elif self.np['text'] is not None:
             if self.kwargs['text_align'] == TextNode.ALeft:
-                self.np['text_pos'] = (-width / 2.0 + self.kwargs['text_pos'][0], self.kwargs['text_pos'][1])
+                options['text_pos'] = (-width / 2.0 + self.kwargs['text_pos'][0], self.kwargs['text_pos'][1])
             elif self.kwargs['text_align'] == TextNode.ARight:
-                self.np['text_pos'] = (width / 2.0 - self.kwargs['text_pos'][0], self.kwargs['text_pos'][1])
+                options['text_pos'] = (width / 2.0 - self.kwargs['text_pos'][0], self.kwargs['text_pos'][1])
             else:
-                self.np['text_pos'] = (0, self.np['text_pos'][1])
+                options['text_pos'] = (0, self.np['text_pos'][1])
+        self.configure(**options)
+
+    def text_options(self, width, height):
+        pad_x, pad_z = self.kwargs.get('pad', (0.0, 0.0))
+        options = dict()
+        if self.text_size == 'wrap':
+            scale = self.kwargs.get('text_scale', 1.0)
+            if not isinstance(scale, (int, float)):
+                scale = scale[0]
+            wrap_width = max(width - 2.0 * pad_x, 0.0) / scale
+            if wrap_width != self.wrap_width:
+                self.wrap_width = wrap_width
+                h_min = self.get_size().h_min
+                self.text_spec = None
+                if self.get_size().h_min != h_min:
+                    # Height for width: Another layout pass is needed.
+                    self.invalidate()
+            options['text_wordwrap'] = wrap_width
+        extent = self.text_extent()
+        align = self.kwargs['text_align']
+        if align == TextNode.ALeft:
+            x = -width / 2.0 + pad_x
+        elif align == TextNode.ARight:
+            x = width / 2.0 - pad_x
+        else:
+            x = 0.0
+        options['text_pos'] = (x, -(extent.top + extent.bottom) / 2.0)
+        return options
 
 
-class ScrollableFrame(SimplexFrame):
+# The size of `DirectScrolledFrame`'s scroll bars with default options.
+DEFAULT_SCROLL_BAR_SIZE = (0.08, 0.08)
+
+
+class FixedFrame(LayoutBoundary, SimplexFrame):
+    """
+    A panel of a fixed `SizeSpec`, no matter what is inside it. As a
+    `LayoutBoundary`, changes inside it only cause its own subtree to be
+    laid out again, so it suits parts of the GUI that change all the
+    time, like a chat window.
+    """
+    __slots__ = ('size_spec', 'boundary_rect')
+
+    def __init__(self, child, size_spec):
+        SimplexFrame.__init__(self, child)
+        self.size_spec = size_spec
+        self.boundary_rect = None
+
+    def get_size(self):
+        return self.size_spec
+
+
+class ScrollableFrame(LayoutBoundary, SimplexFrame):
+    # Its size never depends on its content, so it is a layout boundary.
+    #
+    # Widgets that are scrolled out of view are stashed, so that their
+    # mouse regions aren't tested and they aren't culled every frame;
+    # See `update_clipping`.
+    __slots__ = (
+        'size_spec', 'canvas_size', 'viewport_size', 'boundary_rect',
+        'clip_grid', 'in_view', 'suspended', 'clip_task',
+    )
+
     def __init__(self, child, size_spec=None):
-        self.child = child
+        SimplexFrame.__init__(self, child)
         if size_spec is None:
             size_spec = SizeSpec()
         self.size_spec = size_spec
+        self.boundary_rect = None
+        # Where the widgets on the canvas are, once it was laid out.
+        self.clip_grid = None
+        # The widgets that intersected the viewport last time.
+        self.in_view = set()
+        # The widgets that were stashed for being out of view.
+        self.suspended = set()
+        self.clip_task = None
 
     def create(self, parent, parent_np):
         self.parent = parent
+        self.stats = parent.stats
+        if self.stats is not None:
+            self.stats.count('widgets_created')
         self.np = DirectScrolledFrame(
             parent=parent_np,
             frameColor=(1,0,0,1),
         )
+        self.np.verticalScroll['command'] = self.update_clipping
+        self.np.horizontalScroll['command'] = self.update_clipping
         self.child.create(self, self.np.getCanvas())
 
     def destroy(self):
+        if self.stats is not None:
+            self.stats.count('widgets_destroyed')
+        if self.clip_task is not None:
+            self.clip_task.remove()
+            self.clip_task = None
+        self.clip_grid = None
+        self.in_view = set()
+        self.suspended = set()
+        if self.child is not None:
+            self.child.destroy()
         self.np.destroy()
+        self.np = None
 
     def get_size(self):
         return self.size_spec
 
-    def resize(self, width, height):
+    def scroll_bar_size(self):
+        if self.np is None:
+            return DEFAULT_SCROLL_BAR_SIZE
+        left, right, _, _ = self.np['verticalScroll_frameSize']
+        _, _, bottom, top = self.np['horizontalScroll_frameSize']
+        return right - left, top - bottom
+
+    def layout_children(self, width, height):
+        bar_width, bar_height = self.scroll_bar_size()
+        canvas_width, canvas_height = fit_canvas(
+            self.child.get_size(),
+            width,
+            height,
+            bar_width,
+            bar_height,
+        )
+        return [(self.child, (0.0, 0.0, canvas_width, canvas_height))]
+
+    def apply_size(self, width, height):
+        self.resize_canvas(self.child.get_size(), width, height)
+        self.schedule_clipping()
+
+    def mark_boundary_dirty(self, boundary, relayout=True):
+        # Widgets on the canvas may move without this frame being laid
+        # out again.
+        self.schedule_clipping()
+        SimplexFrame.mark_boundary_dirty(self, boundary, relayout)
+
+    def resize_canvas(self, content_size, width, height):
+        """
+        Size the frame and its canvas for content of `content_size`, and
+        return the canvas' dimensions.
+        """
         self.np['frameSize'] = (0, width, -height, 0)
 
-        min_size = self.child.get_size()
-        actual_width = max(width, min_size.w_min)
-        actual_height = max(height, min_size.h_min)
-        # Is the up-and-down scrollbar active?
-        if actual_height > height:
-            # Can we trim its width from the canvas' width?
-            left, right, _, _ = self.np['verticalScroll_frameSize']
-            bar_width = right - left
-            actual_width = max(width - bar_width, min_size.w_min)
-        # Is the left-and-right scrollbar active?
-        if actual_width > width:
-            # Can we trim its height from the canvas' height?
-            _, _, bottom, top = self.np['horizontalScroll_frameSize']
-            bar_height = top - bottom
-            actual_height = max(height - bar_height, min_size.h_min)
+        bar_width, bar_height = self.scroll_bar_size()
+        actual_width, actual_height = fit_canvas(
+            content_size,
+            width,
+            height,
+            bar_width,
+            bar_height,
+        )
         self.np['canvasSize'] = (
             0,
             actual_width,
             -actual_height,
             0,
         )
-        self.child.resize(actual_width, actual_height)
+
+        # The part of the frame not covered by active scroll bars.
+        self.canvas_size = (actual_width, actual_height)
+        self.viewport_size = (
+            width - bar_width if actual_height > height else width,
+            height - bar_height if actual_width > width else height,
+        )
+        return actual_width, actual_height
+
+    def scroll_offset(self):
+        """
+        How far the canvas is scrolled down from its top.
+        """
+        _, canvas_height = self.canvas_size
+        _, viewport_height = self.viewport_size
+        scroll_range = max(0.0, canvas_height - viewport_height)
+        return self.np.verticalScroll.getRatio() * scroll_range
+
+    def viewport_rect(self):
+        """
+        The part of the canvas that is in view, as `(x, y, width,
+        height)` in the canvas' coordinates.
+        """
+        canvas_width, _ = self.canvas_size
+        viewport_width, viewport_height = self.viewport_size
+        scroll_range = max(0.0, canvas_width - viewport_width)
+        return (
+            self.np.horizontalScroll.getRatio() * scroll_range,
+            -self.scroll_offset(),
+            viewport_width,
+            viewport_height,
+        )
+
+    def schedule_clipping(self):
+        """
+        Find the widgets on the canvas again once the subtree is laid
+        out, before the frame is rendered.
+        """
+        if self.clip_task is None:
+            root = self
+            while root.parent is not None:
+                root = root.parent
+            self.clip_task = base.task_mgr.add(
+                self.update_clip_grid,
+                'metagui clip',
+                sort=getattr(root, 'task_sort', LAYOUT_TASK_SORT) + 1,
+            )
+
+    def clipped_frames(self):
+        """
+        The `Element`s and `ScrollableFrame`s on the canvas, with their
+        rectangles in the canvas' coordinates. Those on the canvases of
+        the latter are clipped by them instead.
+        """
+        stack = [(self.child, 0.0, 0.0)]
+        while stack:
+            frame, left, top = stack.pop()
+            if frame.rect is None:
+                continue
+            x, y, width, height = frame.rect
+            left += x
+            top += y
+            if isinstance(frame, (Element, ScrollableFrame)):
+                if frame.np is not None:
+                    yield frame, (left, top, width, height)
+                continue
+            for child in frame.subframes():
+                if child is not None:
+                    stack.append((child, left, top))
+
+    def update_clip_grid(self, task):
+        self.clip_task = None
+        if self.np is None:
+            return task.done
+        # Lookups are always the size of the viewport, and many items,
+        # like the rows of a list, are as wide as it; Cells of about its
+        # size keep both inserting and looking up cheap.
+        cell_size = max(self.viewport_size) / 2.0
+        if cell_size <= 0.0:
+            cell_size = INDEX_CELL_SIZE
+        grid = SpatialGrid(cell_size)
+        for frame, rect in self.clipped_frames():
+            grid.insert(frame, rect)
+        self.clip_grid = grid
+        in_view = set(grid.query(self.viewport_rect()))
+        for frame in list(self.suspended):
+            if frame in in_view or frame not in grid.rects:
+                self.resume(frame)
+        for frame in grid.rects:
+            if frame not in in_view:
+                self.suspend(frame)
+        self.in_view = in_view
+        return task.done
+
+    def update_clipping(self):
+        """
+        Stash the widgets that have been scrolled out of view, and
+        unstash those that have been scrolled into it. This is called
+        whenever a scroll bar is moved, and only looks at the widgets
+        that were or are in view.
+        """
+        if self.clip_grid is None:
+            return
+        in_view = set(self.clip_grid.query(self.viewport_rect()))
+        for frame in self.in_view - in_view:
+            self.suspend(frame)
+        for frame in in_view - self.in_view:
+            self.resume(frame)
+        self.in_view = in_view
+
+    def suspend(self, frame):
+        np = frame.np
+        if np is None or frame in self.suspended:
+            return
+        if np.guiItem.get_focus():
+            # Keep e.g. an entry that is being typed into working.
+            return
+        np.stash()
+        self.suspended.add(frame)
+
+    def resume(self, frame):
+        if frame not in self.suspended:
+            return
+        self.suspended.remove(frame)
+        if frame.np is not None:
+            frame.np.unstash()
+
+
+class VirtualScrollableFrame(ScrollableFrame):
+    """
+    A vertically scrolling list over a potentially huge sequence of
+    items. All rows take part in the layout through their `SizeSpec`s,
+    but widgets only exist for those intersecting the viewport, plus
+    `overscan` rows above and below it. Rows that scroll out of view are
+    recycled for those scrolling into it, so the number of widgets
+    depends on the size of the viewport, not on the number of items.
+    """
+    __slots__ = (
+        'row_factory', 'bind_row', 'row_size', 'overscan', 'items',
+        'content_cache', 'active_rows', 'spare_rows', 'row_sizes',
+        'row_rects', 'row_tops', 'row_height', 'row_width', 'placing_rows',
+    )
+
+    def __init__(self, items, row_factory, bind_row, row_size,
+                 size_spec=None, overscan=2):
+        """
+        :items:        A sequence with one data item per row.
+        :row_factory:  Called without arguments to create the frame
+                       tree of a row.
+        :bind_row:     Called with a row's frame tree and an item
+                       whenever a row is (re)used to show that item.
+        :row_size:     The `SizeSpec` of all rows, or a function that
+                       returns the `SizeSpec` of a given item's row.
+        :size_spec:    The size of the frame itself.
+        :overscan:     The number of rows kept alive beyond each edge of
+                       the viewport.
+        """
+        ScrollableFrame.__init__(self, None, size_spec=size_spec)
+        self.row_factory = row_factory
+        self.bind_row = bind_row
+        self.row_size = row_size
+        self.overscan = overscan
+        self.items = items
+        self.content_cache = None
+        self.active_rows = dict()  # item index: (row, np)
+        self.spare_rows = []
+        # The `SizeSpec`s of the rows, and where they are on the canvas;
+        # Only for rows of different sizes.
+        self.row_sizes = None
+        self.row_rects = None
+        self.row_tops = None
+        # The size of each row, if all have the same `SizeSpec`.
+        self.row_height = 0.0
+        self.row_width = 0.0
+        # Whether rows are being bound and placed; They are laid out as
+        # part of that, so dirty marks from them can be ignored.
+        self.placing_rows = False
+
+    def create(self, parent, parent_np):
+        self.parent = parent
+        self.stats = parent.stats
+        if self.stats is not None:
+            self.stats.count('widgets_created')
+        self.np = DirectScrolledFrame(
+            parent=parent_np,
+            frameColor=(1,0,0,1),
+        )
+        self.np.verticalScroll['command'] = self.update_viewport
+
+    def destroy(self):
+        rows = list(self.active_rows.values()) + self.spare_rows
+        for row, np in rows:
+            row.destroy()
+            np.remove_node()
+        self.active_rows = dict()
+        self.spare_rows = []
+        ScrollableFrame.destroy(self)
+
+    def subframes(self):
+        rows = list(self.active_rows.values()) + self.spare_rows
+        return [row for row, np in rows]
+
+    def set_items(self, items):
+        """
+        Show a new sequence of items. Rows already alive are kept and
+        bound to the new items.
+        """
+        self.items = items
+        self.content_cache = None
+        if self.np is not None:
+            self.release_rows(list(self.active_rows))
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        if not self.lay_out_rows():
+            LayoutBoundary.mark_dirty(self)
+
+    def invalidate(self):
+        if not self.lay_out_rows():
+            LayoutBoundary.invalidate(self)
+
+    def lay_out_rows(self):
+        """
+        Lay out the rows that were marked dirty again, in place, and
+        return whether there were any. Rows get their sizes from
+        `row_size`, not from their content, so nothing outside of them
+        changes.
+        """
+        if self.placing_rows:
+            return True
+        dirty = [idx for idx, (row, _) in self.active_rows.items()
+                 if row.rect is None]
+        if not dirty:
+            return False
+        self.placing_rows = True
+        try:
+            # Rows with e.g. wrapped text may ask for another pass.
+            for _ in range(MAX_LAYOUT_PASSES):
+                for idx in dirty:
+                    row, np = self.active_rows[idx]
+                    self.place_row(idx, row, np)
+                dirty = [idx for idx in dirty
+                         if self.active_rows[idx][0].rect is None]
+                if not dirty:
+                    break
+        finally:
+            self.placing_rows = False
+        return True
+
+    def item_size(self, item):
+        if isinstance(self.row_size, SizeSpec):
+            return self.row_size
+        return self.row_size(item)
+
+    def get_content_size(self):
+        if self.content_cache is None:
+            if isinstance(self.row_size, SizeSpec):
+                count = len(self.items)
+                self.content_cache = SizeSpec.computed(
+                    w_min=self.row_size.w_min if count else 0.0,
+                    w_weight=1.0,
+                    h_min=self.row_size.h_min * count,
+                    h_weight=self.row_size.h_weight * count,
+                    w_max=self.row_size.w_max,
+                    h_max=self.row_size.h_max * count if count else 0.0,
+                )
+            else:
+                self.row_sizes = [self.item_size(i) for i in self.items]
+                self.content_cache = measure_vertical(self.row_sizes, 1.0)
+        return self.content_cache
+
+    def layout_children(self, width, height):
+        # Rows are laid out on their own; See `update_viewport`.
+        return []
+
+    def schedule_clipping(self):
+        # Only rows near the viewport are alive anyway.
+        pass
+
+    def apply_size(self, width, height):
+        content_size = self.get_content_size()
+        actual_width, actual_height = self.resize_canvas(
+            content_size,
+            width,
+            height,
+        )
+        if isinstance(self.row_size, SizeSpec):
+            rect = arrange_vertical(
+                [self.row_size],
+                content_size,
+                actual_width,
+                actual_height,
+            )[0]
+            self.row_height = rect[3]
+        else:
+            self.row_rects = arrange_vertical(
+                self.row_sizes,
+                content_size,
+                actual_width,
+                actual_height,
+            )
+            self.row_tops = [-y for _, y, _, _ in self.row_rects]
+        self.row_width = actual_width
+
+        self.placing_rows = True
+        try:
+            for idx, (row, np) in self.active_rows.items():
+                self.place_row(idx, row, np)
+        finally:
+            self.placing_rows = False
+        self.update_viewport()
+
+    def row_rect(self, idx):
+        if isinstance(self.row_size, SizeSpec):
+            return (0.0, -idx * self.row_height, self.row_width, self.row_height)
+        _, y, _, height = self.row_rects[idx]
+        return (0.0, y, self.row_width, height)
+
+    def visible_range(self):
+        """
+        The indices of the first and one past the last row to keep
+        alive.
+        """
+        top = self.scroll_offset()
+        bottom = top + self.viewport_size[1]
+        if isinstance(self.row_size, SizeSpec):
+            if self.row_height <= 0.0:
+                return 0, 0
+            first = int(top / self.row_height)
+            last = int(bottom / self.row_height) + 1
+        else:
+            first = bisect_right(self.row_tops, top) - 1
+            last = bisect_left(self.row_tops, bottom)
+        start = max(0, first - self.overscan)
+        stop = min(len(self.items), last + self.overscan)
+        return start, stop
+
+    def place_row(self, idx, row, np):
+        x, y, width, height = self.row_rect(idx)
+        np.set_pos(x, 0, y)
+        # Not `row.resize`, which an `Element` row overrides, so that
+        # every row keeps its `rect`, and only dirty rows are laid out.
+        apply_layout(solve(row, width, height), self.stats)
+
+    def release_rows(self, indices):
+        for idx in indices:
+            row, np = self.active_rows.pop(idx)
+            np.stash()
+            self.spare_rows.append((row, np))
+
+    def update_viewport(self):
+        """
+        Release the rows that have left the viewport, and bind rows to
+        the items that have entered it. This is called whenever the
+        vertical scroll bar is moved.
+
+        Rows that `bind_row` marks dirty are simply laid out when they
+        are placed, instead of the whole frame being laid out again;
+        That would place and bind them again.
+        """
+        if self.placing_rows:
+            return
+        self.placing_rows = True
+        try:
+            start, stop = self.visible_range()
+            self.release_rows(
+                [idx for idx in self.active_rows if not start <= idx < stop]
+            )
+            for idx in range(start, stop):
+                if idx in self.active_rows:
+                    continue
+                if self.spare_rows:
+                    row, np = self.spare_rows.pop()
+                    np.unstash()
+                else:
+                    row = self.row_factory()
+                    np = self.np.getCanvas().attach_new_node(repr(self))
+                    row.create(self, np)
+                self.bind_row(row, self.items[idx])
+                self.place_row(idx, row, np)
+                self.active_rows[idx] = (row, np)
+        finally:
+            self.placing_rows = False
+        # Rows that asked for another pass while being placed
+        self.lay_out_rows()
+
+
+class StaticFrame(SimplexFrame):
+    """
+    Renders the static widgets of its subtree, like labels and plain
+    frames, from one flattened batch of geometry instead of one set of
+    nodes and `Geom`s per widget. Interactive widgets, and anything
+    beneath them, stay live and work as usual.
+
+    The batch is rebuilt once per frame, before rendering, whenever the
+    subtree was laid out anew; That is, after a resize, or after a frame
+    in it was marked dirty. Changing how a static widget looks, e.g. its
+    `text`, therefore only shows up once its `Element` is marked dirty.
+    """
+    __slots__ = ('live_np', 'batch_np', 'hidden', 'rebatch_task')
+
+    def __init__(self, child):
+        SimplexFrame.__init__(self, child)
+        self.live_np = None
+        self.batch_np = None
+        self.hidden = []
+        self.rebatch_task = None
+
+    def create(self, parent, parent_np):
+        self.parent = parent
+        self.stats = parent.stats
+        self.np = parent_np
+        # The batch is drawn first, under the live widgets.
+        self.batch_np = parent_np.attach_new_node('batch')
+        self.live_np = parent_np.attach_new_node('live')
+        self.child.create(self, self.live_np)
+
+    def destroy(self):
+        if self.rebatch_task is not None:
+            self.rebatch_task.remove()
+            self.rebatch_task = None
+        self.child.destroy()
+        self.live_np.remove_node()
+        self.batch_np.remove_node()
+        self.hidden = []
+        self.np = None
+
+    def apply_size(self, width, height):
+        # The subtree is laid out after this, so the batch is rebuilt
+        # later, just before the frame is rendered.
+        self.schedule_rebatch()
+
+    def mark_boundary_dirty(self, boundary, relayout=True):
+        # A `LayoutBoundary` beneath is laid out again without this
+        # frame being laid out again.
+        self.schedule_rebatch()
+        SimplexFrame.mark_boundary_dirty(self, boundary, relayout)
+
+    def schedule_rebatch(self):
+        if self.rebatch_task is None:
+            root = self
+            while root.parent is not None:
+                root = root.parent
+            self.rebatch_task = base.task_mgr.add(
+                self.update_batch,
+                'metagui rebatch',
+                sort=getattr(root, 'task_sort', LAYOUT_TASK_SORT) + 1,
+            )
+
+    def update_batch(self, task):
+        self.rebatch_task = None
+        self.rebatch()
+        return task.done
+
+    def rebatch(self):
+        """
+        Rebuild the batch from the current state of the subtree.
+        """
+        if self.stats is not None:
+            self.stats.count('rebatches')
+        for np in self.batched_widgets():
+            np.show()
+        self.batch_np.node().remove_all_children()
+        copies = []
+        self.hidden = []
+        collect(self.live_np, copies, self.hidden)
+        build_batch(copies, self.live_np, self.batch_np)
+        for np in self.hidden:
+            np.hide()
+
+    def batched_widgets(self):
+        """
+        The widgets hidden in favor of the batch that are still in this
+        subtree; They may have been destroyed, or pooled and reused
+        elsewhere, since the batch was built.
+        """
+        return [
+            np for np in self.hidden
+            if not np.is_empty() and self.live_np.is_ancestor_of(np)
+        ]
+
+    def render_cost(self):
+        """
+        The nodes and `Geom`s that rendering this subtree costs, as
+        `metagui.batch.render_cost`; For what is actually rendered
+        (`'batched'`), and what would be without batching (`'live'`).
+        """
+        hidden = self.batched_widgets()
+        for np in hidden:
+            np.show()
+        live = render_cost(self.live_np)
+        for np in hidden:
+            np.hide()
+        batched = render_cost(self.live_np)
+        for key, value in render_cost(self.batch_np).items():
+            batched[key] += value
+        return dict(live=live, batched=batched)
+
+
+# Prewarming creates lazy subtrees after the frame was rendered (`igLoop`
+# has sort 50), spending at most `PREWARM_BUDGET` seconds per frame.
+PREWARM_TASK_SORT = 55
+PREWARM_BUDGET = 0.002
+
+
+class Prewarmer:
+    """
+    Creates the subtrees of queued `LazyFrame`s, in the order they were
+    queued, from a task that runs while there are any.
+    """
+    def __init__(self):
+        self.queue = deque()
+        self.task = None
+
+    def add(self, frame):
+        frame.queued = True
+        self.queue.append(frame)
+        if self.task is None or not self.task.is_alive():
+            self.task = base.task_mgr.add(
+                self.prewarm,
+                'metagui prewarm',
+                sort=PREWARM_TASK_SORT,
+            )
+
+    def discard(self, frame):
+        # Taking it out of the queue would take linear time, so it is
+        # just skipped once it comes up.
+        frame.queued = False
+
+    def prewarm(self, task):
+        start = perf_counter()
+        queue = self.queue
+        while queue and perf_counter() - start < PREWARM_BUDGET:
+            frame = queue.popleft()
+            if frame.queued:
+                frame.create_child()
+        if queue:
+            return task.cont
+        self.task = None
+        return task.done
+
+
+prewarmer = Prewarmer()
+
+
+class LazyFrame(LayoutBoundary, SimplexFrame):
+    """
+    A subtree whose widgets are only created when it is first shown. It
+    takes its space in the layout all along, but stays empty while
+    hidden.
+
+        options = LazyFrame(options_panel)
+        ...
+        options.show()
+
+    With `prewarm`, the widgets are created in the background, in the
+    time left over after rendering frames, so that showing the subtree
+    later is cheap. They stay hidden until then.
+
+    With a `size_spec`, showing the subtree or changing it only causes
+    the subtree to be laid out again, as in `LayoutBoundary`.
+    """
+    __slots__ = (
+        'size_spec', 'visible', 'created', 'prewarm', 'queued',
+        'boundary_rect',
+    )
+
+    def __init__(self, child, size_spec=None, visible=False, prewarm=False):
+        """
+        :child:        The subtree.
+        :size_spec:    The size of the frame; By default, that of its
+                       child, which can be measured without creating
+                       it.
+        :visible:      Whether to show the subtree right away.
+        :prewarm:      Whether to create the hidden subtree when there
+                       is time to spare.
+        """
+        SimplexFrame.__init__(self, child)
+        self.size_spec = size_spec
+        self.visible = visible
+        self.created = False
+        self.prewarm = prewarm
+        # Whether it waits for `prewarmer` to create the subtree.
+        self.queued = False
+        self.boundary_rect = None
+
+    def create(self, parent, parent_np):
+        self.parent = parent
+        self.stats = parent.stats
+        self.np = parent_np.attach_new_node('lazy')
+        if self.visible:
+            self.create_child()
+        else:
+            self.np.hide()
+            if self.prewarm:
+                prewarmer.add(self)
+
+    def create_child(self):
+        self.queued = False
+        if not self.created:
+            self.child.rect = None
+            self.child.create(self, self.np)
+            self.created = True
+
+    def destroy(self):
+        prewarmer.discard(self)
+        if self.created:
+            self.child.destroy()
+            self.created = False
+        self.np.remove_node()
+        self.np = None
+
+    def is_layout_boundary(self):
+        return self.size_spec is not None
+
+    def get_size(self):
+        if self.size_spec is not None:
+            return self.size_spec
+        return self.child.get_size()
+
+    def layout_children(self, width, height):
+        if self.visible and self.created:
+            return [(self.child, (0.0, 0.0, width, height))]
+        return []
+
+    def show(self):
+        """
+        Show the subtree, creating its widgets if that wasn't done yet.
+        """
+        if self.visible:
+            return
+        self.visible = True
+        if self.np is not None:
+            self.create_child()
+            self.np.show()
+            self.mark_dirty()
+
+    def hide(self):
+        """
+        Hide the subtree. Its widgets are kept for showing it again.
+        """
+        if not self.visible:
+            return
+        self.visible = False
+        if self.np is not None:
+            self.np.hide()
+            # It no longer lays out its child.
+            self.mark_dirty()
 
 
 def spacer(spacer_spec, style=None):
@@ -0,0 +1,622 @@
+"""
+The layout math behind the frames in `metagui.gui`. Nothing in here
+touches the scene graph, so it can be used without a running ShowBase.
+
+Layout happens in two passes. The measure pass goes bottom-up: every
+node computes its `SizeSpec` from those of its children, exactly once.
+The arrange pass goes top-down: every container gets a width and a
+height, and hands out rectangles to its children based on the already
+measured `SizeSpec`s.
+
+Rectangles are `(x, y, width, height)` tuples relative to the top left
+corner of the container. As in Panda3D's 2D space, y points up, so rows
+further down have a negative y.
+
+`solve` lays out a whole tree into a flat table. A tree can be made of
+any nodes that offer `get_size()` and `layout_children(width, height)`,
+the latter returning `(child, rect)` pairs, and a `rect` attribute; The
+frames in `metagui.gui` do, and don't need to be created for it. `rect`
+is the rectangle that the node was last laid out in, or `None` if it or
+anything beneath it changed since, so that it has to be laid out again.
+"""
+from math import inf
+from collections import namedtuple
+from collections import OrderedDict
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Containers with at least this many children are measured and arranged
+# with NumPy, if it is installed. Below that, plain Python is faster.
+VECTORIZE_THRESHOLD = 512
+
+
+# At most this many distinct `SizeSpec`s are interned; When there are
+# more, those that were asked for least recently are dropped.
+INTERN_LIMIT = 1024
+interned = OrderedDict()
+
+
+class SizeSpec(namedtuple('SizeSpec',
+                          'w_min w_weight h_min h_weight w_max h_max')):
+    """
+    The minimal size of a frame, how much of any additional space it
+    claims relative to its siblings, and the maximal size it grows to.
+    A frame's maximum may not be below its minimum; By default, there is
+    none.
+
+    `SizeSpec`s are immutable tuples, so one can be shared by any number
+    of frames. Those made with the constructor are interned: Creating an
+    equal one again returns the existing object, as long as it was
+    asked for recently enough to still be in the table. Use `computed`
+    for throwaway values that shouldn't take up space in it.
+    """
+    __slots__ = ()
+
+    def __new__(cls,
+                w_min=0.0, w_weight=1.0,
+                h_min=0.0, h_weight=1.0,
+                w_max=inf, h_max=inf,
+                ):
+        key = (cls, w_min, w_weight, h_min, h_weight, w_max, h_max)
+        spec = interned.get(key)
+        if spec is not None:
+            interned.move_to_end(key)
+            return spec
+        if w_max < w_min or h_max < h_min:
+            raise ValueError(
+                f"Maximal size ({w_max}, {h_max}) is below minimal "
+                f"size ({w_min}, {h_min})"
+            )
+        spec = tuple.__new__(cls, key[1:])
+        interned[key] = spec
+        if len(interned) > INTERN_LIMIT:
+            evicted, evicted_spec = interned.popitem(last=False)
+            if evicted_spec is DEFAULT_SIZE_SPEC:
+                # The default stays shared, however rarely it is used.
+                interned[evicted] = evicted_spec
+                interned.popitem(last=False)
+        return spec
+
+    @classmethod
+    def computed(cls, w_min, w_weight, h_min, h_weight, w_max=inf, h_max=inf):
+        return tuple.__new__(
+            cls,
+            (w_min, w_weight, h_min, h_weight, w_max, h_max),
+        )
+
+
+# Never dropped from the intern table.
+DEFAULT_SIZE_SPEC = SizeSpec()
+
+
+# Where a child of a `GridFrame` is placed: The row and column of its top
+# left cell, and how many rows and columns it spans.
+GridCell = namedtuple(
+    'GridCell',
+    'row column row_span column_span',
+    defaults=(1, 1),
+)
+
+
+class SizeArrays:
+    """
+    The `SizeSpec`s of a container's children as NumPy arrays, so that
+    wide containers can be measured and arranged with array operations.
+    """
+    def __init__(self, child_sizes):
+        count = len(child_sizes)
+        self.w_min = numpy.fromiter(
+            (c.w_min for c in child_sizes), numpy.float64, count,
+        )
+        self.w_weight = numpy.fromiter(
+            (c.w_weight for c in child_sizes), numpy.float64, count,
+        )
+        self.h_min = numpy.fromiter(
+            (c.h_min for c in child_sizes), numpy.float64, count,
+        )
+        self.h_weight = numpy.fromiter(
+            (c.h_weight for c in child_sizes), numpy.float64, count,
+        )
+        self.w_max = numpy.fromiter(
+            (c.w_max for c in child_sizes), numpy.float64, count,
+        )
+        self.h_max = numpy.fromiter(
+            (c.h_max for c in child_sizes), numpy.float64, count,
+        )
+
+
+def vectorize(child_sizes):
+    """
+    `SizeArrays` for `child_sizes` if it is worth it, `None` otherwise.
+    """
+    if numpy is None or len(child_sizes) < VECTORIZE_THRESHOLD:
+        return None
+    return SizeArrays(child_sizes)
+
+
+class GridArrays:
+    """
+    The `GridCell`s of a grid's children, as the tracks that each one
+    starts and ends at, and their maximal sizes, as NumPy arrays, so
+    that wide grids can be arranged with array operations.
+    """
+    def __init__(self, child_sizes, cells):
+        count = len(cells)
+        self.row = numpy.fromiter(
+            (c.row for c in cells), numpy.intp, count,
+        )
+        self.row_end = numpy.fromiter(
+            (c.row + c.row_span for c in cells), numpy.intp, count,
+        )
+        self.column = numpy.fromiter(
+            (c.column for c in cells), numpy.intp, count,
+        )
+        self.column_end = numpy.fromiter(
+            (c.column + c.column_span for c in cells), numpy.intp, count,
+        )
+        self.w_max = numpy.fromiter(
+            (c.w_max for c in child_sizes), numpy.float64, count,
+        )
+        self.h_max = numpy.fromiter(
+            (c.h_max for c in child_sizes), numpy.float64, count,
+        )
+
+
+def vectorize_grid(child_sizes, cells):
+    """
+    `GridArrays` for a grid's children if it is worth it, `None`
+    otherwise.
+    """
+    if numpy is None or len(cells) < VECTORIZE_THRESHOLD:
+        return None
+    return GridArrays(child_sizes, cells)
+
+
+def total(values):
+    """
+    The sum of an array, added up by the builtin `sum` as on the pure
+    Python path, so results are identical to it. (`numpy.sum` uses
+    pairwise summation, which rounds differently.)
+    """
+    return sum(values.tolist())
+
+
+def offsets(extents):
+    """
+    Where each of a sequence of adjacent `extents` begins.
+    """
+    starts = numpy.empty_like(extents)
+    starts[0] = 0.0
+    numpy.cumsum(extents[:-1], out=starts[1:])
+    return starts
+
+
+# Measure pass
+
+def measure_horizontal(child_sizes, weight, arrays=None):
+    """
+    The `SizeSpec` of children laid out left to right. Minimal widths,
+    width weights and maximal widths add up, the height is that of the
+    highest child. Only maxima that children declare limit the width;
+    Children without weight don't grow anyway.
+    """
+    if arrays is not None:
+        return SizeSpec.computed(
+            w_min=total(arrays.w_min),
+            h_min=float(arrays.h_min.max()),
+            w_weight=total(arrays.w_weight),
+            h_weight=weight,
+            w_max=total(arrays.w_max),
+            h_max=float(arrays.h_max.max()),
+        )
+    return SizeSpec.computed(
+        w_min=sum(c.w_min for c in child_sizes),
+        h_min=max((c.h_min for c in child_sizes), default=0.0),
+        w_weight=sum(c.w_weight for c in child_sizes),
+        h_weight=weight,
+        w_max=sum(c.w_max for c in child_sizes),
+        h_max=max((c.h_max for c in child_sizes), default=inf),
+    )
+
+
+def measure_vertical(child_sizes, weight, arrays=None):
+    """
+    The `SizeSpec` of children laid out top to bottom. Minimal heights,
+    height weights and maximal heights add up, the width is that of the
+    widest child. As in `measure_horizontal`, only declared maxima
+    limit the height.
+    """
+    if arrays is not None:
+        return SizeSpec.computed(
+            w_min=float(arrays.w_min.max()),
+            h_min=total(arrays.h_min),
+            w_weight=weight,
+            h_weight=total(arrays.h_weight),
+            w_max=float(arrays.w_max.max()),
+            h_max=total(arrays.h_max),
+        )
+    return SizeSpec.computed(
+        w_min=max((c.w_min for c in child_sizes), default=0.0),
+        h_min=sum(c.h_min for c in child_sizes),
+        w_weight=weight,
+        h_weight=sum(c.h_weight for c in child_sizes),
+        w_max=max((c.w_max for c in child_sizes), default=inf),
+        h_max=sum(c.h_max for c in child_sizes),
+    )
+
+
+def spread_spanning(tracks, spanning):
+    """
+    Widen the `(mins, weights, maxes)` tracks (columns or rows) of a grid
+    for the `(start, span, size_min, weight, size_max)` of cells that
+    span several of them: What the tracks lack for a cell is added
+    evenly to each, and the cell gives its weight to its tracks if none
+    of them has any. Its maximum is shared out evenly too.
+    """
+    mins, weights, maxes = tracks
+    for start, span, size_min, weight, size_max in spanning:
+        stop = start + span
+        if sum(weights[start:stop]) == 0.0:
+            weights[start:stop] = [weight / span] * span
+        missing = size_min - sum(mins[start:stop])
+        share = missing / span if missing > 0.0 else 0.0
+        max_share = size_max / span
+        for idx in range(start, stop):
+            mins[idx] += share
+            if max_share > maxes[idx]:
+                maxes[idx] = max_share
+            if mins[idx] > maxes[idx]:
+                maxes[idx] = mins[idx]
+
+
+def add_tracks(tracks, count):
+    """
+    Extend `(mins, weights, maxes)` tracks to at least `count` tracks.
+    """
+    missing = count - len(tracks[0])
+    if missing > 0:
+        for values in tracks:
+            values.extend([0.0] * missing)
+
+
+def track_total(tracks):
+    """
+    The `(min, weight, max)` of a grid's columns or rows together.
+    """
+    mins, weights, maxes = tracks
+    return sum(mins), sum(weights), sum(maxes)
+
+
+def measure_grid(child_sizes, cells):
+    """
+    The `SizeSpec` of children placed in the `GridCell`s `cells`, and
+    the `(mins, weights, maxes)` of the grid's columns and rows. A
+    column is as wide as its widest child, claims as much additional
+    space as its hungriest one, and grows as far as the one that grows
+    furthest; Likewise for rows. Columns and rows then add up like the
+    children of a `HorizontalFrame` and a `VerticalFrame` do.
+
+    All cells are looked at in one pass; Those spanning several columns
+    or rows once more per column or row afterwards.
+    """
+    columns = ([], [], [])
+    rows = ([], [], [])
+    w_mins, w_weights, w_maxes = columns
+    h_mins, h_weights, h_maxes = rows
+    w_spanning = []
+    h_spanning = []
+    for (row, column, row_span, column_span), cs in zip(cells, child_sizes):
+        if column_span == 1:
+            if column >= len(w_mins):
+                add_tracks(columns, column + 1)
+            if cs.w_min > w_mins[column]:
+                w_mins[column] = cs.w_min
+            if cs.w_weight > w_weights[column]:
+                w_weights[column] = cs.w_weight
+            if cs.w_max > w_maxes[column]:
+                w_maxes[column] = cs.w_max
+        else:
+            w_spanning.append(
+                (column, column_span, cs.w_min, cs.w_weight, cs.w_max),
+            )
+        if row_span == 1:
+            if row >= len(h_mins):
+                add_tracks(rows, row + 1)
+            if cs.h_min > h_mins[row]:
+                h_mins[row] = cs.h_min
+            if cs.h_weight > h_weights[row]:
+                h_weights[row] = cs.h_weight
+            if cs.h_max > h_maxes[row]:
+                h_maxes[row] = cs.h_max
+        else:
+            h_spanning.append(
+                (row, row_span, cs.h_min, cs.h_weight, cs.h_max),
+            )
+
+    for tracks, spanning in ((columns, w_spanning), (rows, h_spanning)):
+        if spanning:
+            add_tracks(tracks, max(start + span for start, span, *_ in spanning))
+            spread_spanning(tracks, spanning)
+
+    w_min, w_weight, w_max = track_total(columns)
+    h_min, h_weight, h_max = track_total(rows)
+    size = SizeSpec.computed(
+        w_min=w_min,
+        w_weight=w_weight,
+        h_min=h_min,
+        h_weight=h_weight,
+        w_max=w_max,
+        h_max=h_max,
+    )
+    return size, columns, rows
+
+
+# Arrange pass
+
+def flex_unit(available, size_min, size_weight, limits=None):
+    """
+    How much of the space left over after all minimums are satisfied
+    goes to one unit of weight.
+
+    `limits` are the `(saturation, growth, weight)` of the children that
+    stop growing at a maximum: The unit at which they reach it, and how
+    much they have grown by then. When the unit passes a child's
+    saturation, the child keeps its maximal size, and the space that it
+    doesn't take is shared out among the others, which raises the unit.
+    Children are taken out in order of saturation, so this is done in
+    O(n log n). Sizes are then `min(size_min + unit * weight, size_max)`.
+    """
+    if size_weight == 0.0:
+        return 0.0
+    unit = (available - size_min) / size_weight
+    if not limits:
+        return unit
+    remaining = available - size_min
+    total_weight = size_weight
+    for saturation, growth, weight in sorted(limits):
+        if saturation >= unit:
+            break
+        remaining -= growth
+        size_weight -= weight
+        if size_weight <= total_weight * 1e-9:
+            # Every child has reached its maximum.
+            return saturation
+        unit = remaining / size_weight
+    return unit
+
+
+def array_limits(mins, weights, maxes):
+    """
+    The `limits` for `flex_unit` of children given as NumPy arrays.
+    """
+    limited = (maxes < inf) & (weights > 0.0)
+    if not limited.any():
+        return None
+    growth = maxes[limited] - mins[limited]
+    weights = weights[limited]
+    return list(zip(
+        (growth / weights).tolist(),
+        growth.tolist(),
+        weights.tolist(),
+    ))
+
+
+def arrange_horizontal(child_sizes, size, width, height, arrays=None):
+    """
+    Rectangles for `child_sizes` laid out left to right in a container
+    of the given dimensions, whose own measured `SizeSpec` is `size`.
+    Children are no wider and higher than their maximum.
+    """
+    if arrays is not None:
+        limits = array_limits(arrays.w_min, arrays.w_weight, arrays.w_max)
+        unit = flex_unit(width, size.w_min, size.w_weight, limits)
+        c_widths = numpy.minimum(
+            arrays.w_min + unit * arrays.w_weight,
+            arrays.w_max,
+        )
+        lefts = offsets(c_widths)
+        return list(zip(
+            lefts.tolist(),
+            repeat(0.0),
+            c_widths.tolist(),
+            numpy.minimum(height, arrays.h_max).tolist(),  # FIXME
+        ))
+    limits = [
+        ((cs.w_max - cs.w_min) / cs.w_weight, cs.w_max - cs.w_min, cs.w_weight)
+        for cs in child_sizes
+        if cs.w_max < inf and cs.w_weight > 0.0
+    ]
+    unit = flex_unit(width, size.w_min, size.w_weight, limits)
+    rects = []
+    left = 0.0
+    for cs in child_sizes:
+        c_width = cs.w_min + unit * cs.w_weight
+        if c_width > cs.w_max:
+            c_width = cs.w_max
+        c_height = height if height < cs.h_max else cs.h_max  # FIXME
+        rects.append((left, 0.0, c_width, c_height))
+        left += c_width
+    return rects
+
+
+def arrange_vertical(child_sizes, size, width, height, arrays=None):
+    """
+    Rectangles for `child_sizes` laid out top to bottom in a container
+    of the given dimensions, whose own measured `SizeSpec` is `size`.
+    Children are no wider and higher than their maximum.
+    """
+    if arrays is not None:
+        limits = array_limits(arrays.h_min, arrays.h_weight, arrays.h_max)
+        unit = flex_unit(height, size.h_min, size.h_weight, limits)
+        c_heights = numpy.minimum(
+            arrays.h_min + unit * arrays.h_weight,
+            arrays.h_max,
+        )
+        tops = offsets(c_heights)
+        return list(zip(
+            repeat(0.0),
+            (-tops).tolist(),
+            numpy.minimum(width, arrays.w_max).tolist(),  # FIXME
+            c_heights.tolist(),
+        ))
+    limits = [
+        ((cs.h_max - cs.h_min) / cs.h_weight, cs.h_max - cs.h_min, cs.h_weight)
+        for cs in child_sizes
+        if cs.h_max < inf and cs.h_weight > 0.0
+    ]
+    unit = flex_unit(height, size.h_min, size.h_weight, limits)
+    rects = []
+    top = 0.0
+    for cs in child_sizes:
+        c_width = width if width < cs.w_max else cs.w_max  # FIXME
+        c_height = cs.h_min + unit * cs.h_weight
+        if c_height > cs.h_max:
+            c_height = cs.h_max
+        rects.append((0.0, top, c_width, c_height))
+        top -= c_height
+    return rects
+
+
+def track_edges(tracks, available, size_min, size_weight):
+    """
+    Where each of the measured `(mins, weights, maxes)` tracks begins
+    when they share `available` space, followed by where the last one
+    ends.
+    """
+    limits = [
+        ((mx - mn) / w, mx - mn, w)
+        for mn, w, mx in zip(*tracks)
+        if mx < inf and w > 0.0
+    ]
+    unit = flex_unit(available, size_min, size_weight, limits)
+    edges = [0.0]
+    edge = 0.0
+    for size_min, weight, size_max in zip(*tracks):
+        extent = size_min + unit * weight
+        if extent > size_max:
+            extent = size_max
+        edge += extent
+        edges.append(edge)
+    return edges
+
+
+def arrange_grid(child_sizes, cells, columns, rows, size, width, height,
+                 arrays=None):
+    """
+    Rectangles for `child_sizes` placed in the `GridCell`s `cells`, in a
+    grid of the given dimensions with the columns, rows and `SizeSpec`
+    measured by `measure_grid`. Every child fills its cells, up to its
+    maximum.
+    """
+    lefts = track_edges(columns, width, size.w_min, size.w_weight)
+    tops = track_edges(rows, height, size.h_min, size.h_weight)
+    if arrays is not None:
+        lefts = numpy.array(lefts)
+        tops = numpy.array(tops)
+        c_lefts = lefts[arrays.column]
+        c_tops = tops[arrays.row]
+        return list(zip(
+            c_lefts.tolist(),
+            (-c_tops).tolist(),
+            numpy.minimum(lefts[arrays.column_end] - c_lefts,
+                          arrays.w_max).tolist(),
+            numpy.minimum(tops[arrays.row_end] - c_tops,
+                          arrays.h_max).tolist(),
+        ))
+    rects = []
+    for (row, column, row_span, column_span), cs in zip(cells, child_sizes):
+        c_width = lefts[column + column_span] - lefts[column]
+        c_height = tops[row + row_span] - tops[row]
+        rects.append((
+            lefts[column],
+            -tops[row],
+            c_width if c_width < cs.w_max else cs.w_max,
+            c_height if c_height < cs.h_max else cs.h_max,
+        ))
+    return rects
+
+
+def fit(size, width, height):
+    """
+    The dimensions that a tree with the measured `size` actually gets
+    when offered `width` and `height`: Too little space is overridden
+    by the minimum, dimensions without weight don't grow, and none
+    grows beyond its maximum.
+    """
+    if size.w_min > width or size.w_weight == 0.0:
+        width = size.w_min
+    elif size.w_max < width:
+        width = size.w_max
+    if size.h_min > height or size.h_weight == 0.0:
+        height = size.h_min
+    elif size.h_max < height:
+        height = size.h_max
+    return width, height
+
+
+def fit_canvas(size, width, height, bar_width, bar_height):
+    """
+    The dimensions of a scrollable canvas holding a tree with the
+    measured `size` in a viewport of `width` and `height`. Scroll bars
+    that become necessary take their space away from the canvas.
+    """
+    actual_width = max(width, size.w_min)
+    actual_height = max(height, size.h_min)
+    # Is the up-and-down scrollbar active?
+    if actual_height > height:
+        # Can we trim its width from the canvas' width?
+        actual_width = max(width - bar_width, size.w_min)
+    # Is the left-and-right scrollbar active?
+    if actual_width > width:
+        # Can we trim its height from the canvas' height?
+        actual_height = max(height - bar_height, size.h_min)
+    return actual_width, actual_height
+
+
+# Layout of whole trees
+
+# One row of the table made by `solve`. `parent` is `None` for the root,
+# `index` is the node's position among its parent's children, and
+# `depth` its distance from the root. `x` and `y` are relative to the
+# parent, `left` and `top` to the root.
+Placement = namedtuple(
+    'Placement',
+    'node parent index depth x y width height left top',
+)
+
+
+def solve(root, width, height, x=0.0, y=0.0):
+    """
+    Lay out the tree under `root` in the given space, placed at `x` and
+    `y` in its parent if it has one, and return a list
+    of `Placement`s for its nodes in depth-first order, so that each
+    subtree forms a contiguous run, starting with its root.
+
+    A node that gets the same size as when it was last laid out, and
+    whose `rect` is still set, has the same layout inside as back then.
+    Its placement is included, in case it moved, but not those of its
+    descendants, so that unchanged subtrees cost next to nothing.
+    """
+    table = []
+    stack = [Placement(root, None, 0, 0, x, y, width, height, 0.0, 0.0)]
+    while stack:
+        placement = stack.pop()
+        table.append(placement)
+        node, _, _, depth, _, _, p_width, p_height, left, top = placement
+        rect = node.rect
+        if rect is not None and rect[2] == p_width and rect[3] == p_height:
+            continue
+        children = node.layout_children(p_width, p_height)
+        for index in range(len(children) - 1, -1, -1):
+            child, (x, y, c_width, c_height) = children[index]
+            stack.append(Placement(
+                child, node, index, depth + 1,
+                x, y, c_width, c_height,
+                left + x, top + y,
+            ))
+    return table
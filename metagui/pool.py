@@ -0,0 +1,182 @@
+from collections import OrderedDict
+
+from direct.gui.DirectGui import DirectEntry
+from direct.gui.DirectGui import DirectEntryScroll
+from direct.gui.DirectGui import DirectCheckButton
+from direct.gui.DirectGui import DirectRadioButton
+from direct.gui.DirectGui import DirectSlider
+from direct.gui.DirectGui import DirectScrollBar
+from direct.gui.DirectGui import DirectOptionMenu
+from direct.gui.DirectGui import DirectScrolledFrame
+from direct.gui.DirectGui import DirectScrolledList
+
+
+# Widgets that the user changes: The text typed into an entry, the
+# value of a check button or a slider, the position of a scroll bar. A
+# reused one would keep that state from its last user, so by default,
+# these are never pooled.
+STATEFUL_CLASSES = (
+    DirectEntry,
+    DirectEntryScroll,
+    DirectCheckButton,
+    DirectRadioButton,
+    DirectSlider,
+    DirectScrollBar,
+    DirectOptionMenu,
+    DirectScrolledFrame,
+    DirectScrolledList,
+)
+
+
+def freeze(value):
+    """
+    A hashable stand-in for a DirectGUI option value. Raises `TypeError`
+    for values that can't be hashed.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
+class WidgetPool:
+    """
+    Recycles DirectGUI widgets, so that an `Element` that is created
+    again after one with the same class and style was destroyed can
+    reuse that widget instead of constructing a new one.
+
+    Widgets are pooled by their class and a signature of the keyword
+    arguments they were constructed with. Options listed in
+    `reconfigurable` are not part of that signature; Their values are
+    set again when a widget is taken from the pool. A pooled widget is
+    hidden and detached from the scene graph, so it does not render or
+    react to the mouse.
+
+    Widgets whose keyword arguments can't be hashed are never pooled,
+    and neither are those of the `stateful` classes (and their
+    subclasses). Only the options in `reconfigurable` are set when a
+    widget is reused, so state that the user changed, like the text of
+    a `DirectEntry`, would otherwise be passed on to its next user.
+    """
+    def __init__(self, max_per_key=16, max_size=256,
+                 reconfigurable=('text', 'command', 'extraArgs', 'value'),
+                 stateful=STATEFUL_CLASSES):
+        """
+        :max_per_key:    How many idle widgets of the same class and
+                         style are kept at most.
+        :max_size:       How many idle widgets are kept in total. When
+                         exceeded, those of the least recently released
+                         style are destroyed first.
+        :reconfigurable: Options that may differ between the users of
+                         a pooled widget.
+        :stateful:       Widget classes that are never pooled. Pass
+                         fewer only for widgets whose state is reset by
+                         their `reconfigurable` options.
+        """
+        self.max_per_key = max_per_key
+        self.max_size = max_size
+        self.reconfigurable = set(reconfigurable)
+        self.stateful = tuple(stateful)
+        self.idle = OrderedDict()  # key: [widget, ...]
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, element_cls, kwargs):
+        if issubclass(element_cls, self.stateful):
+            return None
+        style = {
+            option: value
+            for option, value in kwargs.items()
+            if option not in self.reconfigurable
+        }
+        reconfigured = tuple(sorted(
+            option
+            for option in kwargs
+            if option in self.reconfigurable
+        ))
+        try:
+            return (element_cls, freeze(style), reconfigured)
+        except TypeError:
+            return None
+
+    def acquire(self, element_cls, kwargs, parent_np):
+        """
+        Return a widget of `element_cls` configured with `kwargs` and
+        attached to `parent_np`; A pooled one if possible.
+        """
+        key = self.key(element_cls, kwargs)
+        widgets = self.idle.get(key)
+        if not widgets:
+            self.misses += 1
+            return element_cls(parent=parent_np, **kwargs)
+
+        self.hits += 1
+        widget = widgets.pop()
+        if not widgets:
+            del self.idle[key]
+        self.size -= 1
+        widget.reparent_to(parent_np)
+        widget.show()
+        options = {
+            option: value
+            for option, value in kwargs.items()
+            if option in self.reconfigurable
+        }
+        if options:
+            widget.configure(**options)
+        return widget
+
+    def release(self, element_cls, kwargs, widget):
+        """
+        Take back a widget that was made by `acquire` with the same
+        arguments. If it can't be kept, it is destroyed.
+        """
+        key = self.key(element_cls, kwargs)
+        if key is None:
+            widget.destroy()
+            return
+        if len(self.idle.get(key, ())) >= self.max_per_key:
+            self.evictions += 1
+            widget.destroy()
+            return
+
+        # Drop references to the widget's last user.
+        if 'command' in self.reconfigurable and 'command' in widget.configure():
+            widget['command'] = None
+        widget.hide()
+        widget.detach_node()
+        self.idle.setdefault(key, []).append(widget)
+        self.idle.move_to_end(key)
+        self.size += 1
+        while self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        key, widgets = next(iter(self.idle.items()))
+        widgets.pop(0).destroy()
+        if not widgets:
+            del self.idle[key]
+        self.size -= 1
+        self.evictions += 1
+
+    def clear(self):
+        """
+        Destroy all idle widgets.
+        """
+        for widgets in self.idle.values():
+            for widget in widgets:
+                widget.destroy()
+        self.idle.clear()
+        self.size = 0
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            idle=self.size,
+        )
@@ -0,0 +1,168 @@
+"""
+A spatial index over rectangles, for finding what is at a point or in an
+area without looking at everything. Like `metagui.layout`, it knows
+nothing about the scene graph.
+
+Rectangles are `(x, y, width, height)` tuples, `x` and `y` being the top
+left corner, with y pointing up as in `metagui.layout`. A rectangle
+covers the points from its left edge up to, but excluding, its right
+edge, and from its top edge down to, but excluding, its bottom edge, so
+that adjacent rectangles don't share any points.
+"""
+from math import floor
+
+
+# Items covering more than this many cells are not put in the cells,
+# but in a list that every lookup goes through; Otherwise a few large
+# items would make inserting and removing them expensive.
+LARGE_ITEM_CELLS = 64
+
+
+def contains(rect, x, y):
+    left, top, width, height = rect
+    return left <= x < left + width and top - height < y <= top
+
+
+def intersects(rect, other):
+    """
+    Whether two rectangles share any points. A rectangle without area
+    still shares those on its edges with the rectangles around it.
+    """
+    left, top, width, height = rect
+    o_left, o_top, o_width, o_height = other
+    return (
+        left <= o_left + o_width and o_left < left + width and
+        top - height <= o_top and o_top - o_height < top
+    )
+
+
+def intersection(rect, other):
+    """
+    The rectangle that two rectangles have in common, or `None` if they
+    don't intersect.
+    """
+    if not intersects(rect, other):
+        return None
+    left, top, width, height = rect
+    o_left, o_top, o_width, o_height = other
+    i_left = max(left, o_left)
+    i_top = min(top, o_top)
+    return (
+        i_left,
+        i_top,
+        min(left + width, o_left + o_width) - i_left,
+        i_top - max(top - height, o_top - o_height),
+    )
+
+
+class SpatialGrid:
+    """
+    A uniform grid of square cells of `cell_size`, each of which lists
+    the items whose rectangles overlap it. Looking up a point only looks
+    at the items of one cell, so with cells about the size of typical
+    items, it takes constant time no matter how many items there are.
+    """
+    def __init__(self, cell_size=0.1):
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.rects = dict()
+        self.large = set()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def cell_range(self, rect):
+        """
+        The first and last columns and rows of cells that `rect` touches.
+        Rows count downwards.
+        """
+        left, top, width, height = rect
+        size = self.cell_size
+        return (
+            floor(left / size),
+            floor((left + width) / size),
+            floor(-top / size),
+            floor((height - top) / size),
+        )
+
+    def insert(self, item, rect):
+        """
+        Add `item` with its rectangle, or move it there if it is already
+        in the grid.
+        """
+        if item in self.rects:
+            if self.rects[item] == rect:
+                return
+            self.remove(item)
+        self.rects[item] = rect
+        first_column, last_column, first_row, last_row = self.cell_range(rect)
+        count = (last_column - first_column + 1) * (last_row - first_row + 1)
+        if count > LARGE_ITEM_CELLS:
+            self.large.add(item)
+            return
+        cells = self.cells
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = cells.get((column, row))
+                if cell is None:
+                    cells[column, row] = {item}
+                else:
+                    cell.add(item)
+
+    def remove(self, item):
+        rect = self.rects.pop(item, None)
+        if rect is None:
+            return
+        if item in self.large:
+            self.large.remove(item)
+            return
+        cells = self.cells
+        first_column, last_column, first_row, last_row = self.cell_range(rect)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = cells[column, row]
+                cell.discard(item)
+                if not cell:
+                    del cells[column, row]
+
+    def clear(self):
+        self.cells.clear()
+        self.rects.clear()
+        self.large.clear()
+
+    def at(self, x, y):
+        """
+        The items whose rectangles contain the point.
+        """
+        size = self.cell_size
+        cell = self.cells.get((floor(x / size), floor(-y / size)), ())
+        rects = self.rects
+        found = [item for item in cell if contains(rects[item], x, y)]
+        found.extend(
+            item for item in self.large if contains(rects[item], x, y)
+        )
+        return found
+
+    def query(self, rect):
+        """
+        The items whose rectangles intersect `rect`, each once.
+        """
+        rects = self.rects
+        first_column, last_column, first_row, last_row = self.cell_range(rect)
+        count = (last_column - first_column + 1) * (last_row - first_row + 1)
+        if count > len(self.cells):
+            # Cheaper to look at every item than at every cell.
+            return [item for item, r in rects.items() if intersects(r, rect)]
+        cells = self.cells
+        found = dict()
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                for item in cells.get((column, row), ()):
+                    if item not in found and intersects(rects[item], rect):
+                        found[item] = None
+        found.update(
+            (item, None)
+            for item in self.large
+            if intersects(rects[item], rect)
+        )
+        return list(found)
@@ -0,0 +1,94 @@
+from time import perf_counter
+
+from panda3d.core import PStatCollector
+
+
+COUNTERS = (
+    'relayouts:event',
+    'relayouts:dirty',
+    'relayouts:task',
+    'relayouts:explicit',
+    'relayouts:boundary',
+    'get_size',
+    'measure',
+    'resize',
+    'option_writes',
+    'option_writes_skipped',
+    'widgets_created',
+    'widgets_destroyed',
+    'rebatches',
+)
+
+
+class LayoutStats:
+    """
+    Counters and timers for one `WholeScreen`. Frames report to it
+    only while it exists, so with statistics disabled the cost is one
+    `is None` check per report.
+
+    `frame` holds the counts for the current frame, `last_frame` those
+    of the previous one, and `totals` those since creation. Times spent
+    in named subtrees (see `SimplexFrame.stats_name`) are accumulated in
+    `subtree_time`, in seconds.
+
+    All counters and timers are also fed to PStats, under `metagui:` and
+    the name of the `WholeScreen`, so they can be viewed next to
+    Panda3D's own frame timings.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.frame = {counter: 0 for counter in COUNTERS}
+        self.last_frame = dict(self.frame)
+        self.totals = dict(self.frame)
+        self.subtree_time = dict()
+        self.level_collectors = {
+            counter: PStatCollector(f'metagui:{name}:{counter}')
+            for counter in COUNTERS
+        }
+        self.time_collectors = dict()
+        self.started = dict()
+
+    def count(self, counter, amount=1):
+        self.frame[counter] += amount
+
+    def start(self, timer):
+        """
+        Start timing `timer`. It may already be running, e.g. for nested
+        subtrees with the same name; Then only the outermost start and
+        stop count, so that no time is counted twice.
+        """
+        running = self.started.get(timer)
+        if running is not None:
+            start, depth = running
+            self.started[timer] = (start, depth + 1)
+            return
+        if timer not in self.time_collectors:
+            self.time_collectors[timer] = PStatCollector(
+                f'metagui:{self.name}:{timer}',
+            )
+        self.time_collectors[timer].start()
+        self.started[timer] = (perf_counter(), 1)
+
+    def stop(self, timer):
+        start, depth = self.started[timer]
+        if depth > 1:
+            self.started[timer] = (start, depth - 1)
+            return
+        del self.started[timer]
+        duration = perf_counter() - start
+        self.time_collectors[timer].stop()
+        self.subtree_time[timer] = self.subtree_time.get(timer, 0.0) + duration
+
+    def end_frame(self):
+        """
+        Publish the current frame's counts, and start counting anew.
+        """
+        for counter, amount in self.frame.items():
+            self.totals[counter] += amount
+            self.level_collectors[counter].set_level(amount)
+        self.last_frame = self.frame
+        self.frame = {counter: 0 for counter in COUNTERS}
+
+    def end_frame_task(self, task):
+        self.end_frame()
+        return task.cont
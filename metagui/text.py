@@ -0,0 +1,103 @@
+from collections import OrderedDict
+
+from panda3d.core import TextNode
+
+from direct.gui import DirectGuiGlobals as DGG
+
+
+class TextExtent:
+    """
+    The box that a text takes up, in the units of the frame it is
+    placed in, relative to the text's origin: `left`, `right`, `bottom`
+    and `top`. These follow the font's line metrics, not the glyphs, so
+    texts with the same number of lines have the same height.
+    """
+    __slots__ = ('left', 'right', 'bottom', 'top')
+
+    def __init__(self, left, right, bottom, top):
+        self.left = left
+        self.right = right
+        self.bottom = bottom
+        self.top = top
+
+    @property
+    def width(self):
+        return self.right - self.left
+
+    @property
+    def height(self):
+        return self.top - self.bottom
+
+
+EMPTY_EXTENT = TextExtent(0.0, 0.0, 0.0, 0.0)
+
+
+class TextMeasurer:
+    """
+    Measures texts with a `TextNode`, remembering the `max_size` most
+    recently used measurements. Text is assembled anew for every
+    measurement, so relayouts would be expensive without the cache.
+    """
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.node = TextNode('metagui text measurer')
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def measure(self, text, font=None, scale=1.0, wordwrap=None):
+        """
+        The `TextExtent` of `text` as DirectGUI would show it with the
+        options `text_font`, `text_scale` and `text_wordwrap`. `scale`
+        may be a number or an `(x, z)` pair; `wordwrap` is in unscaled
+        text units, like `text_wordwrap`.
+        """
+        if not text:
+            return EMPTY_EXTENT
+        if font is None:
+            font = DGG.getDefaultFont()
+        if not isinstance(scale, (int, float)):
+            scale = tuple(scale)
+        key = (text, font, scale, wordwrap)
+        extent = self.cache.get(key)
+        if extent is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return extent
+
+        self.misses += 1
+        if isinstance(scale, tuple):
+            scale_x, scale_z = scale
+        else:
+            scale_x = scale_z = scale
+        node = self.node
+        node.set_font(font)
+        if wordwrap is None:
+            node.clear_wordwrap()
+        else:
+            node.set_wordwrap(wordwrap)
+        node.set_text(text)
+        extent = TextExtent(
+            node.get_left() * scale_x,
+            node.get_right() * scale_x,
+            node.get_bottom() * scale_z,
+            node.get_top() * scale_z,
+        )
+        self.cache[key] = extent
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return extent
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self.cache),
+        )
+
+
+# Shared by all `Element`s that size themselves to their text.
+text_measurer = TextMeasurer()
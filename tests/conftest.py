@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.fixture(scope='session')
+def base():
+    """
+    A `ShowBase` without a window, for tests that create widgets.
+    """
+    pytest.importorskip('panda3d')
+    from panda3d.core import load_prc_file_data
+    load_prc_file_data(
+        '',
+        'window-type none\n'
+        'audio-library-name null\n'
+        'notify-level-device fatal\n'
+    )
+    from direct.showbase.ShowBase import ShowBase
+    showbase = ShowBase()
+    yield showbase
+    showbase.destroy()
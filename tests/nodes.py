@@ -0,0 +1,123 @@
+"""
+Minimal layout nodes built on `metagui.layout` alone, so that layouts
+can be tested without Panda3D. They offer what `solve` needs, and keep
+their parent so that a change can be reported up the tree.
+"""
+from metagui.layout import SizeSpec
+from metagui.layout import vectorize
+from metagui.layout import measure_horizontal
+from metagui.layout import measure_vertical
+from metagui.layout import arrange_horizontal
+from metagui.layout import arrange_vertical
+
+
+class Box:
+    def __init__(self, size):
+        self.size = size
+        self.parent = None
+        self.rect = None
+
+    def get_size(self):
+        return self.size
+
+    def layout_children(self, width, height):
+        return []
+
+    def set_size(self, size):
+        self.size = size
+        self.invalidate()
+
+    def invalidate(self):
+        node = self
+        while node is not None:
+            node.rect = None
+            node.size_cache = None
+            node = node.parent
+
+
+class Container(Box):
+    def __init__(self, *children, weight=1.0):
+        Box.__init__(self, None)
+        self.children = list(children)
+        self.weight = weight
+        self.size_cache = None
+        for child in children:
+            child.parent = self
+
+    def get_size(self):
+        if self.size_cache is None:
+            self.child_sizes = [c.get_size() for c in self.children]
+            self.arrays = vectorize(self.child_sizes)
+            self.size_cache = self.measure(
+                self.child_sizes, self.weight, self.arrays,
+            )
+        return self.size_cache
+
+    def layout_children(self, width, height):
+        size = self.get_size()
+        rects = self.arrange(
+            self.child_sizes, size, width, height, self.arrays,
+        )
+        return list(zip(self.children, rects))
+
+
+class Row(Container):
+    measure = staticmethod(measure_horizontal)
+    arrange = staticmethod(arrange_horizontal)
+
+
+class Column(Container):
+    measure = staticmethod(measure_vertical)
+    arrange = staticmethod(arrange_vertical)
+
+
+def random_size(rng, maxima=False):
+    """
+    A random `SizeSpec`, sometimes without weight, and with maxima only
+    if asked for.
+    """
+    w_min = rng.choice([0.0, rng.uniform(0.0, 0.5)])
+    h_min = rng.choice([0.0, rng.uniform(0.0, 0.5)])
+    w_weight = rng.choice([0.0, 1.0, rng.uniform(0.0, 3.0)])
+    h_weight = rng.choice([0.0, 1.0, rng.uniform(0.0, 3.0)])
+    w_max = h_max = float('inf')
+    if maxima and rng.random() < 0.3:
+        w_max = w_min + rng.uniform(0.0, 0.5)
+    if maxima and rng.random() < 0.3:
+        h_max = h_min + rng.uniform(0.0, 0.5)
+    return SizeSpec.computed(w_min, w_weight, h_min, h_weight, w_max, h_max)
+
+
+def random_tree(rng, depth=4, maxima=False, horizontal=None):
+    """
+    A random tree of `Row`s and `Column`s with `Box` leaves.
+    """
+    if horizontal is None:
+        horizontal = rng.random() < 0.5
+    if depth == 0 or rng.random() < 0.2:
+        return Box(random_size(rng, maxima))
+    children = [
+        random_tree(rng, depth - 1, maxima, not horizontal)
+        for _ in range(rng.randint(1, 4))
+    ]
+    frame_cls = Row if horizontal else Column
+    return frame_cls(*children, weight=rng.choice([0.0, 1.0, 2.0]))
+
+
+def leaves(node):
+    return [n for n in nodes(node) if not isinstance(n, Container)]
+
+
+def apply(table):
+    """
+    What `metagui.gui.apply_layout` does, minus the widgets: Remember
+    where each node was laid out.
+    """
+    for node, _, _, _, x, y, width, height, _, _ in table:
+        node.rect = (x, y, width, height)
+
+
+def nodes(node):
+    yield node
+    for child in getattr(node, 'children', ()):
+        yield from nodes(child)
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('panda3d')
+
+from direct.gui import DirectGuiGlobals as DGG
+from direct.gui.DirectGui import DirectFrame
+from direct.gui.DirectGui import DirectLabel
+from direct.gui.DirectGui import DirectButton
+
+from metagui.gui import WholeScreen
+from metagui.gui import HorizontalFrame
+from metagui.gui import StaticFrame
+from metagui.gui import Element
+from metagui.batch import is_static
+
+
+def static_gui(*elements):
+    static = StaticFrame(HorizontalFrame(*elements))
+    gui = WholeScreen(static)
+    static.rebatch()
+    return gui, static
+
+
+def test_is_static(base):
+    widgets = [
+        (DirectFrame(), True),
+        (DirectLabel(text='label'), True),
+        (DirectFrame(state=DGG.NORMAL), False),
+        (DirectLabel(text='tip', state=DGG.NORMAL), False),
+        (DirectButton(text='button'), False),
+    ]
+    for widget, static in widgets:
+        assert is_static(widget.guiItem) == static
+        widget.destroy()
+
+
+def test_interactive_widgets_stay_live(base):
+    label = Element(DirectLabel, kwargs=dict(text='label', text_pos=(0, 0)))
+    tooltip = Element(DirectFrame, kwargs=dict(state=DGG.NORMAL))
+    button = Element(DirectButton, kwargs=dict(text='button', text_pos=(0, 0)))
+    gui, static = static_gui(label, tooltip, button)
+    tooltip.np.bind(DGG.ENTER, lambda event: None)
+    static.rebatch()
+    assert label.np.is_hidden()
+    assert not tooltip.np.is_hidden()
+    assert not button.np.is_hidden()
+    assert static.batch_np.get_num_children() > 0
+    gui.destroy()
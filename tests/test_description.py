@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from metagui.gui import VerticalFrame
+from metagui.gui import Element
+from metagui.gui import LazyFrame
+from metagui.gui import WholeScreen
+from metagui.description import compile_description
+from metagui.description import load_compiled
+from metagui.description import Builder
+from metagui.description import Screen
+from metagui.description import dump
+from metagui.description import LazyBuild
+
+
+def on_quit():
+    pass
+
+
+DESCRIPTION = {
+    'styles': {
+        'title': {'text_scale': 0.07, 'frameColor': [1, 0, 0, 1]},
+    },
+    'root': {
+        'type': 'VerticalFrame',
+        'weight': 2.0,
+        'children': [
+            {'type': 'Element', 'class': 'DirectLabel', 'style': 'title',
+             'kwargs': {'text': 'Foo', 'text_pos': [0, 0]}, 'size': [0.0, 1.0, 0.1, 0.0]},
+            {'type': 'Element', 'class': 'DirectButton',
+             'kwargs': {'text': 'Quit', 'command': {'$': 'quit'}},
+             'size': [0.2, 0.0, 0.1, 0.0, 0.3, None], 'text_size': 'fit'},
+            {'type': 'HorizontalFrame', 'children': [
+                {'type': 'Empty', 'size': [0.1, 1.0, 0.0, 1.0]},
+                {'type': 'FixedFrame', 'size': [0.5, 0.0, 0.5, 0.0],
+                 'child': {'type': 'Empty'}},
+            ]},
+            {'type': 'GridFrame', 'cells': [
+                {'child': {'type': 'Empty'}, 'row': 0, 'column': 0},
+                {'child': {'type': 'Empty'}, 'row': 1, 'column': 0,
+                 'row_span': 1, 'column_span': 2},
+            ]},
+            {'type': 'ScrollableFrame', 'size': [0.0, 1.0, 0.0, 1.0],
+             'child': {'type': 'StaticFrame', 'child': {'type': 'Empty'}}},
+            {'type': 'LazyFrame', 'size': [0.0, 1.0, 0.2, 0.0],
+             'child': {'type': 'Element', 'class': 'DirectLabel',
+                       'kwargs': {'text': 'Later', 'text_pos': [0, 0]}}},
+            {'type': 'LazyFrame', 'visible': True, 'prewarm': True,
+             'child': {'type': 'Empty', 'size': [0.1, 1.0, 0.1, 0.0]}},
+        ],
+    },
+}
+BINDINGS = dict(quit=on_quit)
+
+
+def build(description):
+    compiled = compile_description(description)
+    return Builder(bindings=BINDINGS).build(compiled)
+
+
+def test_build():
+    root = build(DESCRIPTION)
+    assert isinstance(root, VerticalFrame)
+    assert root.weight == 2.0
+    title, button = root.children[:2]
+    assert isinstance(title, Element)
+    assert title.kwargs['text_scale'] == 0.07
+    assert title.kwargs['frameColor'] == (1, 0, 0, 1)
+    assert button.kwargs['command'] is on_quit
+    assert button.size_spec.w_max == 0.3
+    assert button.text_size == 'fit'
+
+
+def test_dump_round_trip():
+    dumped = dump(build(DESCRIPTION), bindings=BINDINGS)
+    reloaded = json.loads(json.dumps(dumped))
+    again = dump(build(reloaded), bindings=BINDINGS)
+    assert again == dumped
+    assert compile_description(reloaded) == compile_description(again)
+
+
+def test_unbound_values_are_refused():
+    root = build(DESCRIPTION)
+    with pytest.raises(TypeError):
+        dump(root)
+
+
+def test_unknown_node_type():
+    with pytest.raises(ValueError):
+        compile_description({'root': {'type': 'Nonsense'}})
+
+
+def test_cache(tmp_path):
+    path = tmp_path / 'screen.json'
+    path.write_text(json.dumps(DESCRIPTION), encoding='utf-8')
+    cache_dir = tmp_path / 'cache'
+    compiled = load_compiled(str(path), str(cache_dir))
+    assert compiled == compile_description(DESCRIPTION)
+    assert len(list(cache_dir.iterdir())) == 1
+    assert load_compiled(str(path), str(cache_dir)) == compiled
+
+    screen = Screen(str(path), cache_dir=str(cache_dir))
+    root = screen.build(bindings=BINDINGS)
+    assert dump(root, bindings=BINDINGS) == dump(build(DESCRIPTION), bindings=BINDINGS)
+
+
+def test_lazy_frame(base):
+    root = build(DESCRIPTION)
+    sized, measured = root.children[-2:]
+    assert isinstance(sized, LazyFrame)
+    assert isinstance(sized.child, LazyBuild)
+    assert sized.size_spec.h_min == 0.2
+    assert (sized.visible, sized.prewarm) == (False, False)
+    assert (measured.visible, measured.prewarm) == (True, True)
+
+    gui = WholeScreen(root)
+    # Only the subtree without a size had to be built, to be measured.
+    assert sized.child.child is None
+    assert measured.child.child is not None
+    sized.show()
+    label = sized.child.child
+    assert isinstance(label, Element)
+    assert label.kwargs['text'] == 'Later'
+    assert label.np is not None
+    gui.destroy()
@@ -0,0 +1,375 @@
+import random
+from math import inf
+
+import pytest
+
+from metagui.layout import SizeSpec
+from metagui.layout import DEFAULT_SIZE_SPEC
+from metagui.layout import INTERN_LIMIT
+from metagui.layout import interned
+from metagui.layout import GridCell
+from metagui.layout import flex_unit
+from metagui.layout import measure_horizontal
+from metagui.layout import arrange_horizontal
+from metagui.layout import measure_vertical
+from metagui.layout import arrange_vertical
+from metagui.layout import measure_grid
+from metagui.layout import arrange_grid
+from metagui.layout import vectorize
+from metagui.layout import vectorize_grid
+from metagui.layout import fit
+from metagui.layout import fit_canvas
+from metagui.layout import solve
+
+from tests.nodes import random_size
+from tests.nodes import random_tree
+from tests.nodes import leaves
+from tests.nodes import nodes
+from tests.nodes import apply
+from tests.nodes import Box
+from tests.nodes import Row
+from tests.nodes import Column
+
+
+def size(w_min=0.0, w_weight=1.0, h_min=0.0, h_weight=1.0,
+         w_max=inf, h_max=inf):
+    return SizeSpec.computed(w_min, w_weight, h_min, h_weight, w_max, h_max)
+
+
+def approx_rects(rects):
+    return [pytest.approx(rect) for rect in rects]
+
+
+def widths(child_sizes, width):
+    container = measure_horizontal(child_sizes, 1.0)
+    rects = arrange_horizontal(child_sizes, container, width, 1.0)
+    return [rect[2] for rect in rects]
+
+
+# flex_unit
+
+def test_flex_unit_without_weight():
+    assert flex_unit(1.0, 0.2, 0.0) == 0.0
+
+
+def test_flex_unit_without_limits():
+    assert flex_unit(1.0, 0.2, 2.0) == pytest.approx(0.4)
+
+
+def test_flex_unit_limit_not_reached():
+    assert widths([size(w_max=0.6), size()], 1.0) == [0.5, 0.5]
+
+
+def test_flex_unit_saturation_passes_space_on():
+    assert widths([size(w_max=0.2), size()], 1.0) == pytest.approx([0.2, 0.8])
+
+
+def test_flex_unit_saturation_in_order():
+    child_sizes = [size(w_max=0.3), size(w_max=0.1), size(w_weight=2.0)]
+    # The second child saturates first, then the first one; The third
+    # gets the rest.
+    assert widths(child_sizes, 1.0) == pytest.approx([0.3, 0.1, 0.6])
+
+
+def test_flex_unit_all_saturated():
+    child_sizes = [size(w_min=0.1, w_max=0.2), size(w_max=0.3)]
+    assert widths(child_sizes, 2.0) == pytest.approx([0.2, 0.3])
+
+
+def test_vertical_saturation():
+    child_sizes = [size(h_max=0.2), size(h_min=0.1)]
+    container = measure_vertical(child_sizes, 1.0)
+    rects = arrange_vertical(child_sizes, container, 1.0, 1.0)
+    assert rects == approx_rects([(0.0, 0.0, 1.0, 0.2), (0.0, -0.2, 1.0, 0.8)])
+
+
+# measure_grid and arrange_grid
+
+def test_grid_tracks():
+    cells = [GridCell(0, 0), GridCell(0, 1), GridCell(1, 0), GridCell(1, 1)]
+    child_sizes = [
+        size(w_min=0.2, h_min=0.1),
+        size(w_min=0.1, h_min=0.3, w_weight=2.0),
+        size(w_min=0.4, h_min=0.1, h_weight=0.0),
+        size(w_min=0.1, h_min=0.1, h_weight=0.0),
+    ]
+    grid, columns, rows = measure_grid(child_sizes, cells)
+    assert columns == ([0.4, 0.1], [1.0, 2.0], [inf, inf])
+    assert rows == ([0.3, 0.1], [1.0, 0.0], [inf, inf])
+    assert grid == (0.5, 3.0, 0.4, 1.0, inf, inf)
+
+
+def test_grid_empty_tracks():
+    # Column 1 and row 1 hold nothing.
+    cells = [GridCell(0, 0), GridCell(2, 2)]
+    child_sizes = [size(w_min=0.1, h_min=0.1), size(w_min=0.2, h_min=0.2)]
+    grid, columns, rows = measure_grid(child_sizes, cells)
+    assert columns == ([0.1, 0.0, 0.2], [1.0, 0.0, 1.0], [inf, 0.0, inf])
+    assert rows == ([0.1, 0.0, 0.2], [1.0, 0.0, 1.0], [inf, 0.0, inf])
+    rects = arrange_grid(child_sizes, cells, columns, rows, grid, 0.5, 0.5)
+    assert rects == approx_rects([
+        (0.0, 0.0, 0.2, 0.2),
+        (0.2, -0.2, 0.3, 0.3),
+    ])
+
+
+def test_grid_spanning_cell_widens_its_tracks():
+    cells = [GridCell(0, 0), GridCell(0, 1), GridCell(1, 0, 1, 2)]
+    child_sizes = [
+        size(w_min=0.1, h_min=0.1),
+        size(w_min=0.1, h_min=0.1),
+        size(w_min=0.6, h_min=0.1),
+    ]
+    grid, columns, rows = measure_grid(child_sizes, cells)
+    # Each column gets half of what they lack for the spanning cell.
+    assert columns[0] == pytest.approx([0.3, 0.3])
+    assert grid.w_min == pytest.approx(0.6)
+    rects = arrange_grid(child_sizes, cells, columns, rows, grid, 1.0, 0.2)
+    assert rects == approx_rects([
+        (0.0, 0.0, 0.5, 0.1),
+        (0.5, 0.0, 0.5, 0.1),
+        (0.0, -0.1, 1.0, 0.1),
+    ])
+
+
+def test_grid_spanning_cell_gives_weight_to_weightless_tracks():
+    cells = [GridCell(0, 0), GridCell(0, 1), GridCell(1, 0, 1, 2)]
+    child_sizes = [
+        size(w_weight=0.0),
+        size(w_weight=0.0),
+        size(w_weight=2.0),
+    ]
+    _, columns, _ = measure_grid(child_sizes, cells)
+    assert columns[1] == [1.0, 1.0]
+
+
+def test_grid_children_keep_their_maximum():
+    cells = [GridCell(0, 0), GridCell(1, 0)]
+    child_sizes = [size(w_max=0.1, h_max=0.1), size()]
+    grid, columns, rows = measure_grid(child_sizes, cells)
+    rects = arrange_grid(child_sizes, cells, columns, rows, grid, 1.0, 1.0)
+    assert rects == approx_rects([
+        (0.0, 0.0, 0.1, 0.1),
+        (0.0, -0.1, 1.0, 0.9),
+    ])
+
+
+# fit and fit_canvas
+
+def test_fit():
+    assert fit(size(w_min=0.5, h_min=0.5), 1.0, 2.0) == (1.0, 2.0)
+    assert fit(size(w_min=0.5, h_min=0.5), 0.2, 0.3) == (0.5, 0.5)
+    assert fit(size(w_min=0.5, w_weight=0.0, h_weight=0.0), 1.0, 1.0) == (0.5, 0.0)
+    assert fit(size(w_max=0.7, h_max=0.8), 1.0, 1.0) == (0.7, 0.8)
+
+
+def test_fit_canvas_content_fits():
+    assert fit_canvas(size(w_min=0.5, h_min=0.5), 1.0, 1.0, 0.1, 0.1) == (1.0, 1.0)
+
+
+def test_fit_canvas_vertical_bar():
+    assert fit_canvas(size(w_min=0.5, h_min=2.0), 1.0, 1.0, 0.1, 0.1) == (0.9, 2.0)
+
+
+def test_fit_canvas_horizontal_bar():
+    assert fit_canvas(size(w_min=2.0, h_min=0.5), 1.0, 1.0, 0.1, 0.1) == (2.0, 0.9)
+
+
+def test_fit_canvas_both_bars():
+    assert fit_canvas(size(w_min=2.0, h_min=3.0), 1.0, 1.0, 0.1, 0.1) == (2.0, 3.0)
+    # Beside the vertical bar, the content keeps its minimal width.
+    assert fit_canvas(size(w_min=0.95, h_min=2.0), 1.0, 1.0, 0.1, 0.1) == (0.95, 2.0)
+
+
+# solve
+
+def rects(root):
+    return [node.rect for node in nodes(root)]
+
+
+def full_relayout(root, width, height):
+    for node in nodes(root):
+        node.rect = None
+        node.size_cache = None
+    apply(solve(root, width, height))
+    return rects(root)
+
+
+def test_solve_skips_unchanged_tree():
+    root = random_tree(random.Random(0), depth=4)
+    apply(solve(root, 2.0, 1.0))
+    assert len(solve(root, 2.0, 1.0)) == 1
+
+
+@pytest.mark.parametrize('maxima', [False, True])
+def test_solve_incremental_matches_full(maxima):
+    rng = random.Random(1)
+    for _ in range(50):
+        root = random_tree(rng, depth=5, maxima=maxima)
+        width, height = rng.uniform(0.5, 3.0), rng.uniform(0.5, 3.0)
+        apply(solve(root, width, height))
+        for _ in range(5):
+            for leaf in rng.sample(leaves(root), 1 + len(leaves(root)) // 4):
+                if rng.random() < 0.7:
+                    leaf.set_size(random_size(rng, maxima))
+            if rng.random() < 0.5:
+                width, height = rng.uniform(0.5, 3.0), rng.uniform(0.5, 3.0)
+            apply(solve(root, width, height))
+            incremental = rects(root)
+            assert incremental == full_relayout(root, width, height)
+
+
+# NumPy and plain Python
+
+def random_sizes(rng, count):
+    return [random_size(rng, maxima=True) for _ in range(count)]
+
+
+@pytest.mark.parametrize('measure, arrange', [
+    (measure_horizontal, arrange_horizontal),
+    (measure_vertical, arrange_vertical),
+])
+def test_vectorized_matches_python(measure, arrange):
+    pytest.importorskip('numpy')
+    rng = random.Random(2)
+    for count in (512, 600, 2000):
+        child_sizes = random_sizes(rng, count)
+        arrays = vectorize(child_sizes)
+        assert arrays is not None
+        container = measure(child_sizes, 1.0)
+        assert measure(child_sizes, 1.0, arrays) == container
+        for available in (0.0, 10.0, 200.0, 1000.0):
+            assert (
+                arrange(child_sizes, container, available, available, arrays)
+                == arrange(child_sizes, container, available, available)
+            )
+
+
+def test_vectorized_grid_matches_python():
+    pytest.importorskip('numpy')
+    rng = random.Random(3)
+    cells = []
+    for idx in range(600):
+        row, column = divmod(idx, 20)
+        cells.append(GridCell(row, column, rng.choice([1, 1, 2]), rng.choice([1, 1, 3])))
+    child_sizes = random_sizes(rng, len(cells))
+    arrays = vectorize_grid(child_sizes, cells)
+    assert arrays is not None
+    grid, columns, rows = measure_grid(child_sizes, cells)
+    for available in (1.0, 20.0, 100.0):
+        assert (
+            arrange_grid(child_sizes, cells, columns, rows, grid,
+                         available, available, arrays)
+            == arrange_grid(child_sizes, cells, columns, rows, grid,
+                            available, available)
+        )
+
+
+# The original algorithm
+
+def original_size(node):
+    """
+    The size of a node as the frames measured it before `SizeSpec`s had
+    maxima.
+    """
+    if isinstance(node, Row):
+        child_sizes = [original_size(c) for c in node.children]
+        return (
+            sum(c[0] for c in child_sizes),
+            sum(c[1] for c in child_sizes),
+            max(c[2] for c in child_sizes),
+            node.weight,
+        )
+    if isinstance(node, Column):
+        child_sizes = [original_size(c) for c in node.children]
+        return (
+            max(c[0] for c in child_sizes),
+            node.weight,
+            sum(c[2] for c in child_sizes),
+            sum(c[3] for c in child_sizes),
+        )
+    return node.size[:4]
+
+
+def original_layout(node, x, y, width, height):
+    """
+    The rects of a node and its descendants as the frames laid them out
+    before `metagui.layout` existed.
+    """
+    rects = [(x, y, width, height)]
+    if isinstance(node, Row):
+        w_min, w_weight, _, _ = original_size(node)
+        unit = 0.0 if w_weight == 0.0 else (width - w_min) / w_weight
+        left = 0.0
+        for child in node.children:
+            c_w_min, c_w_weight, _, _ = original_size(child)
+            c_width = c_w_min + unit * c_w_weight
+            rects.extend(original_layout(child, left, 0.0, c_width, height))
+            left += c_width
+    elif isinstance(node, Column):
+        _, _, h_min, h_weight = original_size(node)
+        unit = 0.0 if h_weight == 0.0 else (height - h_min) / h_weight
+        top = 0.0
+        for child in node.children:
+            _, _, c_h_min, c_h_weight = original_size(child)
+            c_height = c_h_min + unit * c_h_weight
+            rects.extend(original_layout(child, 0.0, top, width, c_height))
+            top -= c_height
+    return rects
+
+
+def original_screen(root, width, height):
+    w_min, w_weight, h_min, h_weight = original_size(root)
+    if w_min > width or w_weight == 0.0:
+        width = w_min
+    if h_min > height or h_weight == 0.0:
+        height = h_min
+    return original_layout(root, 0.0, 0.0, width, height)
+
+
+def screen(root, width, height):
+    width, height = fit(root.get_size(), width, height)
+    apply(solve(root, width, height))
+    return rects(root)
+
+
+def test_weightless_child_does_not_limit_its_parent():
+    inner = Row(Box(size(w_min=0.3, w_weight=0.0)))
+    sibling = Box(size(w_min=0.1))
+    root = Row(Column(inner), sibling)
+    assert root.get_size().w_max == inf
+    screen(root, 2.0, 1.0)
+    assert sibling.rect[2] == pytest.approx(0.9)
+
+
+def test_same_as_original_without_maxima():
+    rng = random.Random(4)
+    for _ in range(300):
+        root = random_tree(rng, depth=5)
+        width, height = rng.uniform(0.5, 3.0), rng.uniform(0.5, 3.0)
+        assert screen(root, width, height) == original_screen(root, width, height)
+
+
+# Interning
+
+def test_interned():
+    assert SizeSpec(w_min=0.3, h_min=0.1) is SizeSpec(w_min=0.3, h_min=0.1)
+    assert SizeSpec() is DEFAULT_SIZE_SPEC
+
+
+def test_intern_table_keeps_recent_specs():
+    common = SizeSpec(w_min=0.3, h_min=0.1)
+    for idx in range(2 * INTERN_LIMIT):
+        SizeSpec(h_min=0.05 + idx * 1e-4)
+        if idx % 100 == 0:
+            assert SizeSpec(w_min=0.3, h_min=0.1) is common
+    assert len(interned) == INTERN_LIMIT
+    assert SizeSpec(w_min=0.3, h_min=0.1) is common
+    assert SizeSpec(w_min=0.2, h_min=0.1) is SizeSpec(w_min=0.2, h_min=0.1)
+    assert SizeSpec() is DEFAULT_SIZE_SPEC
+
+
+def test_computed_specs_are_not_interned():
+    count = len(interned)
+    SizeSpec.computed(0.123, 1.0, 0.456, 1.0)
+    assert len(interned) == count
@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip('panda3d')
+
+from direct.gui.DirectGui import DirectLabel
+
+from metagui.gui import WholeScreen
+from metagui.gui import VerticalFrame
+from metagui.gui import LazyFrame
+from metagui.gui import Element
+from metagui.gui import prewarmer
+
+
+def prewarm_tasks(base):
+    return len(base.task_mgr.getTasksNamed('metagui prewarm'))
+
+
+def lazy_gui(count=1, prewarm=True, visible=False):
+    frames = [
+        LazyFrame(Element(DirectLabel), prewarm=prewarm, visible=visible)
+        for _ in range(count)
+    ]
+    return WholeScreen(VerticalFrame(*frames)), frames
+
+
+def finish_prewarming(base):
+    while prewarm_tasks(base):
+        base.task_mgr.step()
+
+
+def test_created_on_show(base):
+    gui, (lazy,) = lazy_gui(prewarm=False)
+    assert lazy.child.np is None
+    lazy.show()
+    assert lazy.child.np is not None
+    assert lazy.child.rect is not None
+    gui.destroy()
+
+
+def test_prewarm(base):
+    gui, frames = lazy_gui(count=3)
+    assert all(f.child.np is None for f in frames)
+    finish_prewarming(base)
+    assert all(f.child.np is not None for f in frames)
+    assert all(f.np.is_hidden() for f in frames)
+    gui.destroy()
+
+
+def test_destroyed_frames_are_skipped(base):
+    gui, frames = lazy_gui(count=3)
+    gui.destroy()
+    finish_prewarming(base)
+    assert all(f.child.np is None for f in frames)
+    assert not prewarmer.queue
+
+
+def test_one_prewarm_task(base):
+    gui, _ = lazy_gui()
+    gui.destroy()
+    # The queue still holds the destroyed frame, and gets a new one.
+    other, frames = lazy_gui(count=2)
+    assert prewarm_tasks(base) == 1
+    finish_prewarming(base)
+    assert all(f.child.np is not None for f in frames)
+    other.destroy()
+    # Once the task is done, queueing a frame starts it again.
+    gui, (lazy,) = lazy_gui()
+    assert prewarm_tasks(base) == 1
+    finish_prewarming(base)
+    assert lazy.child.np is not None
+    gui.destroy()
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('panda3d')
+
+from direct.gui.DirectGui import DirectLabel
+from direct.gui.DirectGui import DirectButton
+from direct.gui.DirectGui import DirectEntry
+
+from metagui.pool import WidgetPool
+
+
+def test_reuse(base):
+    pool = WidgetPool()
+    style = dict(frameColor=(1, 0, 0, 1))
+    label = pool.acquire(DirectLabel, dict(text='a', **style), base.aspect2d)
+    pool.release(DirectLabel, dict(text='a', **style), label)
+    assert pool.stats()['idle'] == 1
+    again = pool.acquire(DirectLabel, dict(text='b', **style), base.aspect2d)
+    assert again is label
+    assert again['text'] == 'b'
+    assert not again.is_hidden()
+    pool.release(DirectLabel, dict(text='b', **style), again)
+    # A different style doesn't get it.
+    other = pool.acquire(DirectLabel, dict(text='c'), base.aspect2d)
+    assert other is not label
+    assert pool.stats() == dict(hits=1, misses=2, evictions=0, idle=1)
+    other.destroy()
+    pool.clear()
+
+
+def test_command_is_dropped_on_release(base):
+    pool = WidgetPool()
+    kwargs = dict(text='ok', command=print)
+    button = pool.acquire(DirectButton, kwargs, base.aspect2d)
+    pool.release(DirectButton, kwargs, button)
+    assert button['command'] is None
+    pool.clear()
+
+
+def test_stateful_widgets_are_not_pooled(base):
+    pool = WidgetPool()
+    entry = pool.acquire(DirectEntry, dict(initialText='a'), base.aspect2d)
+    entry.enterText('typed')
+    pool.release(DirectEntry, dict(initialText='a'), entry)
+    assert entry.is_empty()
+    again = pool.acquire(DirectEntry, dict(initialText='a'), base.aspect2d)
+    assert again.get() == 'a'
+    assert pool.stats()['idle'] == 0
+    again.destroy()
+
+
+def test_stateful_widgets_can_be_pooled_on_request(base):
+    pool = WidgetPool(stateful=())
+    entry = pool.acquire(DirectEntry, dict(), base.aspect2d)
+    pool.release(DirectEntry, dict(), entry)
+    assert pool.acquire(DirectEntry, dict(), base.aspect2d) is entry
+    entry.destroy()
@@ -0,0 +1,99 @@
+import random
+
+from metagui.spatial import SpatialGrid
+from metagui.spatial import contains
+from metagui.spatial import intersects
+from metagui.spatial import intersection
+
+
+def test_at():
+    grid = SpatialGrid(cell_size=0.1)
+    grid.insert('a', (0.0, 0.0, 0.2, 0.2))
+    grid.insert('b', (0.1, -0.1, 0.2, 0.2))
+    assert sorted(grid.at(0.05, -0.05)) == ['a']
+    assert sorted(grid.at(0.15, -0.15)) == ['a', 'b']
+    assert grid.at(0.5, -0.5) == []
+
+
+def test_edges_belong_to_one_rectangle():
+    grid = SpatialGrid(cell_size=0.1)
+    grid.insert('left', (0.0, 0.0, 0.2, 0.2))
+    grid.insert('right', (0.2, 0.0, 0.2, 0.2))
+    grid.insert('below', (0.0, -0.2, 0.2, 0.2))
+    # The left and top edges are inside, the right and bottom ones not.
+    assert grid.at(0.2, -0.1) == ['right']
+    assert grid.at(0.1, -0.2) == ['below']
+    assert grid.at(0.0, 0.0) == ['left']
+    assert grid.at(0.4, -0.1) == []
+    assert not contains((0.0, 0.0, 0.2, 0.2), 0.2, -0.1)
+
+
+def test_move_and_remove():
+    grid = SpatialGrid(cell_size=0.1)
+    grid.insert('a', (0.0, 0.0, 0.1, 0.1))
+    grid.insert('a', (1.0, -1.0, 0.1, 0.1))
+    assert len(grid) == 1
+    assert grid.at(0.05, -0.05) == []
+    assert grid.at(1.05, -1.05) == ['a']
+    grid.remove('a')
+    grid.remove('a')
+    assert len(grid) == 0
+    assert grid.cells == {}
+
+
+def test_query():
+    grid = SpatialGrid(cell_size=0.1)
+    for idx in range(10):
+        grid.insert(idx, (idx * 0.1, 0.0, 0.1, 0.1))
+    # Each item once, even if it spans several cells of the query.
+    assert sorted(grid.query((0.25, 0.0, 0.3, 0.05))) == [2, 3, 4, 5]
+    # A query larger than the grid looks at every item.
+    assert sorted(grid.query((-10.0, 10.0, 20.0, 20.0))) == list(range(10))
+    assert grid.query((5.0, -5.0, 0.1, 0.1)) == []
+
+
+def test_large_items():
+    grid = SpatialGrid(cell_size=0.01)
+    grid.insert('background', (0.0, 0.0, 1.0, 1.0))
+    grid.insert('button', (0.5, -0.5, 0.01, 0.01))
+    assert 'background' in grid.large
+    assert all('background' not in cell for cell in grid.cells.values())
+    assert sorted(grid.at(0.505, -0.505)) == ['background', 'button']
+    assert grid.at(0.1, -0.1) == ['background']
+    assert sorted(grid.query((0.4, -0.4, 0.2, 0.2))) == ['background', 'button']
+    grid.remove('background')
+    assert grid.at(0.1, -0.1) == []
+    assert not grid.large
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    grid = SpatialGrid(cell_size=0.05)
+    rects = dict()
+    for idx in range(500):
+        size = rng.choice([0.01, 0.05, 0.2, 1.0])
+        rect = (
+            rng.uniform(-1.0, 1.0),
+            rng.uniform(-1.0, 1.0),
+            rng.uniform(0.0, size),
+            rng.uniform(0.0, size),
+        )
+        rects[idx] = rect
+        grid.insert(idx, rect)
+    # Some are large enough to be kept out of the cells.
+    assert grid.large
+    for _ in range(200):
+        x, y = rng.uniform(-1.2, 1.2), rng.uniform(-1.2, 1.2)
+        expected = {i for i, r in rects.items() if contains(r, x, y)}
+        assert set(grid.at(x, y)) == expected
+        area = (x, y, rng.uniform(0.0, 0.5), rng.uniform(0.0, 0.5))
+        expected = {i for i, r in rects.items() if intersects(r, area)}
+        found = grid.query(area)
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+
+
+def test_intersection():
+    assert intersection((0.0, 0.0, 0.2, 0.2), (0.1, -0.1, 0.2, 0.2)) == \
+        (0.1, -0.1, 0.1, 0.1)
+    assert intersection((0.0, 0.0, 0.1, 0.1), (0.5, 0.0, 0.1, 0.1)) is None
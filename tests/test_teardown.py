@@ -0,0 +1,102 @@
+import warnings
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from direct.gui.DirectGui import DirectLabel
+
+from metagui.gui import SizeSpec
+from metagui.gui import WholeScreen
+from metagui.gui import HorizontalFrame
+from metagui.gui import VerticalFrame
+from metagui.gui import ScrollableFrame
+from metagui.gui import StaticFrame
+from metagui.gui import LazyFrame
+from metagui.gui import Element
+from metagui.debug import walk
+from metagui.debug import find_leaks
+
+
+CYCLES = 20
+
+
+def label(idx):
+    return Element(
+        DirectLabel,
+        kwargs=dict(text=str(idx), text_pos=(0, 0)),
+        size_spec=SizeSpec(w_min=0.1, h_min=0.1, h_weight=0.0),
+    )
+
+
+def tree():
+    return VerticalFrame(
+        ScrollableFrame(
+            VerticalFrame(*[label(idx) for idx in range(50)]),
+        ),
+        StaticFrame(HorizontalFrame(label(0), label(1))),
+        LazyFrame(label(2), prewarm=True),
+    )
+
+
+def footprint(base):
+    """
+    What GUIs that weren't torn down would leave behind, and make every
+    frame more expensive.
+    """
+    return (
+        len(base.task_mgr.getAllTasks()),
+        len(base.messenger.who_accepts('aspectRatioChanged') or {}),
+        base.a2dTopLeft.get_num_children(),
+    )
+
+
+def frame_relayouts(base):
+    gui = WholeScreen(tree(), stats=True)
+    base.task_mgr.step()
+    gui.stats.end_frame()
+    base.messenger.send('aspectRatioChanged')
+    base.task_mgr.step()
+    relayouts = gui.stats.last_frame['relayouts:event']
+    gui.destroy()
+    return relayouts
+
+
+@pytest.mark.parametrize('options', [
+    dict(),
+    dict(deferred=True, stats=True, on_task=True),
+    dict(resize_policy='frame'),
+    dict(resize_policy='settle', settle_time=10.0),
+    dict(resize_policy='scale', settle_time=10.0),
+])
+def test_no_leaks_after_destroy(base, options):
+    gui = WholeScreen(tree(), **options)
+    frames = list(walk(gui))
+    scrollable, static, _ = gui.child.children
+    # Destroyed with the clip and rebatch tasks, and a settle task, still
+    # pending.
+    assert scrollable.clip_task is not None
+    assert static.rebatch_task is not None
+    base.messenger.send('aspectRatioChanged')
+    gui.destroy()
+    assert find_leaks(frames) == []
+
+
+def test_check_leaks_is_quiet(base):
+    gui = WholeScreen(tree(), check_leaks=True, stats=True)
+    base.task_mgr.step()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        gui.destroy()
+
+
+def test_constant_cost_over_cycles(base):
+    before = footprint(base)
+    relayouts_before = frame_relayouts(base)
+    for _ in range(CYCLES):
+        gui = WholeScreen(tree(), deferred=True, stats=True)
+        base.task_mgr.step()
+        base.messenger.send('aspectRatioChanged')
+        gui.destroy()
+    assert footprint(base) == before
+    assert frame_relayouts(base) == relayouts_before == 1